@@ -1,13 +1,10 @@
 import os
 import sys
 import re
-from prompt_toolkit import PromptSession, print_formatted_text
-from prompt_toolkit.formatted_text import FormattedText
-from prompt_toolkit.history import FileHistory
-from prompt_toolkit.completion import CompleteEvent
-from prompt_toolkit.document import Document
-from prompt_toolkit.styles import Style
-from prompt_toolkit.enums import EditingMode
+
+# prompt_toolkit, the dialogs and the completers are only needed once there is
+# a screen to draw on. They are imported where they are used so that one-shot
+# (-e) and redirected-stdin runs start without loading them.
 
 # MINIQUERY custom imports:
 sys.path.append(".." + os.sep + "src")
@@ -19,52 +16,54 @@ from configManager import masterDataConfig as dataConfig
 from argumentClassifier import ArgumentClassifier
 from queryProcessor import QueryProcessor, HiddenQueryProcessor
 from databaseConnection import miniDbConnection as dbConn
+from batchExecutor import BatchExecutor
+from resultCache import miniResultCache as resultCache
 from prompts import stringToPrompt
+from commandTokenizer import tokenizeCommand
+from commandExpander import CommandExpander
+from parallelSource import ParallelSource
 
 sys.path.append(".." + os.sep + "util")
-from miniCompleter import MiniCompleter
-from commandCompleter import CommandCompleter
 from miniGlobals import settingOptionsMap, commandList, tqlCommands, tqlArgumentSummaries, tqlDescriptions
-from miniDialogs import yes_no_dialog, button_dialog, input_dialog, MiniListBoxDialog, MiniFileDialog
-
-class MiniFileHistory(FileHistory):
-    '''
-    A specialized FileHistory that handles file access issues gracefully
-    '''
-    def __init__(self, filename):
-        self._doStore = True
-        super(MiniFileHistory, self).__init__(filename)
-
-    def store_string(self, string: str):
-        if self._doStore:
-            try:
-                FileHistory.store_string(self, string)
-            except PermissionError as ex:
-                self._doStore = False
-                em.setException(ex, "Miniquery command history file", "Commands will not be saved.")
 
 class MiniqueryApp():
     def __init__(self, settingsFile=None):
         self._programSettingsFile=settingsFile
         self._args = None
+        self._expander = CommandExpander()
 
     def setHistory(self, history):
         self._historyObject = history
 
-    def dispatchCommand(self, cmd):
+    def _classifyCommand(self, cmd):
+        '''
+        Unravel the aliases and variables of a command, split it into words and
+        classify them. Returns (cmd, argv, args), the unraveled command, its
+        words and their ArgumentClassifier; args is None if the command could
+        not be split, and the error is left set.
+        '''
         # Unravel aliases and variables
         leader = ms.settings['leader']
         if cmd.startswith(leader):
             cmd = self._unravelVariables(self._unravelAliases(cmd, leader))
         else:
             cmd = self._unravelVariables(cmd)
-    
+
         # Preprocess the command and distinguish system commands from queries
         argv = commandToWordList(cmd)
         if em.getError() != ReturnCode.SUCCESS:
+            return cmd, argv, None
+        return cmd, argv, ArgumentClassifier().classify(argv, leader)
+
+    def dispatchCommand(self, cmd, classified=None):
+        '''
+        Run a command. classified may hold what _classifyCommand() returned for it.
+        '''
+        cmd, argv, args = classified or self._classifyCommand(cmd)
+        if args is None:
             em.doWarn()
             return em.getError()
-        self._args = ArgumentClassifier().classify(argv, leader)
+        self._args = args
     
         # Process the command as a query or as a system command
         if self._args._isQueryCommand:
@@ -100,6 +99,58 @@ class MiniqueryApp():
     
         return ReturnCode.SUCCESS
 
+    def runBatch(self, inputFp, continueOnError=False):
+        '''
+        Bulk execution of redirected input. Consecutive literal-SQL DML commands
+        are handed to a BatchExecutor, which commits them in batches and uses
+        executemany() where it can; every other command is dispatched as usual,
+        after the pending DML has been flushed.
+        '''
+        executor = BatchExecutor(int(ms.settings['batchSize']), continueOnError)
+        leader = ms.settings['leader']
+        retValue = ReturnCode.SUCCESS
+        for line in inputFp:
+            sql = self._batchableSql(line, leader)
+            if sql:
+                retValue = executor.add(sql)
+            else:
+                retValue = executor.flush()
+                if retValue == ReturnCode.SUCCESS:
+                    retValue = self.dispatchCommand(line)
+
+            if retValue == ReturnCode.USER_EXIT:
+                break
+            elif retValue != ReturnCode.SUCCESS:
+                if not continueOnError:
+                    break
+                em.resetError()
+                retValue = ReturnCode.SUCCESS
+
+        if retValue == ReturnCode.SUCCESS:
+            retValue = executor.flush()
+        executor.reportTotals()
+        return retValue
+
+    def _batchableSql(self, cmd, leader):
+        '''
+        Return the literal SQL of a command if it is a DML statement to be run
+        by \sq, otherwise None.
+        '''
+        if not cmd.startswith(leader):
+            return None
+        cmd = self._unravelAliases(cmd, leader)
+        if cmd[len(leader):].split(None, 1)[0:1] != ['sq']:
+            return None
+        argv = commandToWordList(self._unravelVariables(cmd))
+        if em.getError() != ReturnCode.SUCCESS:
+            # Leave it to dispatchCommand() to report the problem
+            em.resetError()
+            return None
+        args = ArgumentClassifier().classify(argv, leader)
+        if 'r' in args._options and args._literalSql and BatchExecutor.isBatchable(args._literalSql):
+            return args._literalSql
+        return None
+
     def doHistory(self, argv):
         argc = len(argv)
 
@@ -115,7 +166,8 @@ class MiniqueryApp():
         return ReturnCode.SUCCESS
 
     def doSql(self, sql):
-        fullSql = " ".join(sql)
+        # Without the leading options (-csv, -ndjson, -arrow ...), that apply to the output
+        fullSql = self._args._literalSql or ""
         retValue = QueryProcessor(self._args).process(fullSql)
         if retValue != ReturnCode.SUCCESS:
             em.doWarn()
@@ -129,6 +181,7 @@ class MiniqueryApp():
         return ReturnCode.SUCCESS
 
     def doQuit(self, argv):
+        from miniDialogs import yes_no_dialog, button_dialog, MiniFileDialog
         if ms.isChanged():
             choice = button_dialog(title='Save before quitting?',
                     text='Save changes to your MINIQUERY settings before quitting?',
@@ -162,6 +215,7 @@ class MiniqueryApp():
         if ms.isChanged():
             # Save program settings, variables and aliases
             if ms.isOutputTty:
+                from miniDialogs import MiniFileDialog
                 choice = MiniFileDialog('Save Settings File', self._programSettingsFile,
                         can_create_new=True) if argc<1 else argv[0]
                 if not choice:
@@ -196,6 +250,7 @@ class MiniqueryApp():
 
         # Do not allow simple erasure of the table name. See doSetDatabase().
         if len(argv) == 0:
+            from miniDialogs import MiniListBoxDialog
             tableName = MiniListBoxDialog(title='Select a table', itemList=tableList)
             if not tableName:
                 return ReturnCode.SUCCESS
@@ -227,11 +282,44 @@ class MiniqueryApp():
             em.doWarn("Results display format updated to " + optionsTuple[0][choice] + ".")
         return ReturnCode.SUCCESS
 
+    def doCache(self, argv):
+        if argv and argv[0] == 'clear':
+            resultCache.clear()
+        elif argv:
+            em.setError(ReturnCode.ILLEGAL_ARGUMENT)
+            em.doWarn(msg='USAGE: cache [clear]')
+            return ReturnCode.SUCCESS
+
+        lookups = resultCache.hits + resultCache.misses
+        print('Result cache: {} ({} entries, {} of {} bytes)'.format(
+                'on' if ms.settings.as_bool('resultCache') else 'off',
+                len(resultCache), resultCache.size, ms.settings['resultCacheBytes']))
+        print('Hits: {}  Misses: {}  Hit rate: {:.1f}%'.format(resultCache.hits, resultCache.misses,
+                100.0 * resultCache.hits / lookups if lookups else 0))
+        print('Evictions: {}  Invalidations: {}'.format(resultCache.evictions, resultCache.invalidations))
+        return ReturnCode.SUCCESS
+
+    def doRefresh(self, argv):
+        if argv not in ([], ['full']):
+            em.setError(ReturnCode.ILLEGAL_ARGUMENT)
+            em.doWarn(msg='USAGE: refresh [full]')
+            return ReturnCode.SUCCESS
+
+        dbName = ms.settings['database']
+        refreshed = dataConfig.refreshDatabase(dbName, full=bool(argv))
+        if refreshed is None:
+            em.doWarn()
+            return ReturnCode.SUCCESS
+        changed, dropped = refreshed
+        print('Schema cache of {}: {} table(s) fetched, {} dropped.'.format(dbName, len(changed), len(dropped)))
+        return ReturnCode.SUCCESS
+
     def doSetDatabase(self, argv):
         # Do not allow simple erasure of the db name. Bring up a selection dlg
         # offering the option to cancel back to the current name. Since the set
         # of DBs is (only) changeable by CREATE DATABASE, use a list box.
         if len(argv) == 0:
+            from miniDialogs import MiniListBoxDialog
             dbList = list(iter(dataConfig.databases))
             dbName = MiniListBoxDialog(title='Select a database', itemList=dbList)
             if not dbName:
@@ -261,6 +349,7 @@ class MiniqueryApp():
             elif isinstance(exc, OperationalError):
                 # The user probably specified a nonexistent DB. Offer to create one.
                 em.resetError()
+                from miniDialogs import yes_no_dialog
                 if yes_no_dialog(title='Database not found',
                                  text='Database %s not found. Create?' % dbName):
                     createDbSql = "CREATE DATABASE %s" % dbName
@@ -292,21 +381,33 @@ class MiniqueryApp():
         return ReturnCode.SUCCESS
 
     def doSource(self, argv):
+        # An optional -j=<threads> runs the file's read-only queries in parallel
+        option = None
+        if argv and argv[0].startswith('-j'):
+            option = argv.pop(0)[2:].lstrip('=')
         argc = len(argv)
 
         # Source a command file
-        fileName = MiniFileDialog('Open File', os.getcwd()) if argc<1 else argv[0]
+        if argc < 1:
+            from miniDialogs import MiniFileDialog
+            fileName = MiniFileDialog('Open File', os.getcwd())
+        else:
+            fileName = argv[0]
         if not fileName:
             return ReturnCode.SUCCESS
 
+        threadCount = self._sourceThreadCount(option)
         print('Sourcing ' + fileName)
         try:
             with open(fileName, 'r') as sourceFp:
-                for line in sourceFp:
-                    retValue = self.dispatchCommand(line)
-                    if retValue != ReturnCode.SUCCESS:
-                        em.doWarn()
-                        break
+                if threadCount > 1:
+                    self._sourceInParallel(sourceFp, threadCount)
+                else:
+                    for line in sourceFp:
+                        retValue = self.dispatchCommand(line)
+                        if retValue != ReturnCode.SUCCESS:
+                            em.doWarn()
+                            break
         except FileNotFoundError:
             print('Cannot find file ' + fileName)
         except PermissionError:
@@ -314,6 +415,56 @@ class MiniqueryApp():
 
         return ReturnCode.SUCCESS
 
+    def _sourceThreadCount(self, option):
+        '''
+        The number of threads for running a sourced file: the -j option's
+        value, or the sourceThreads setting. It is kept below what the
+        connection pool can lend, so the workers never wait on it.
+        '''
+        try:
+            threadCount = int(option) if option else int(ms.settings['sourceThreads'])
+        except ValueError:
+            print('Illegal thread count "{}"; sourcing sequentially'.format(option))
+            return 1
+        pool = ms.connection['Pool']
+        maxOverflow = pool.as_int('maxOverflow')
+        if maxOverflow >= 0:
+            # One pooled connection stays with the main thread
+            threadCount = min(threadCount, pool.as_int('poolSize') + maxOverflow - 1)
+        return threadCount
+
+    def _sourceInParallel(self, sourceFp, threadCount):
+        '''
+        Source a file, running its read-only queries threadCount at a time.
+        Every other command waits for the queries before it, then runs alone.
+        '''
+        # Make sure there is an engine for the workers to borrow connections from
+        dbConn.getConnection()
+        if em.getError() != ReturnCode.SUCCESS:
+            em.doWarn()
+            return
+
+        with ParallelSource(threadCount) as runner:
+            for line in sourceFp:
+                classified = self._classifyCommand(line)
+                argv, args = classified[1:]
+                if args is not None and not argv:
+                    # A blank line
+                    continue
+                literalSql = runner.readOnlySql(args) if args is not None else None
+                if literalSql is not None:
+                    retValue = runner.submit(args, literalSql)
+                else:
+                    retValue = runner.drain()
+                    if retValue == ReturnCode.SUCCESS:
+                        retValue = self.dispatchCommand(line, classified)
+                        if retValue != ReturnCode.SUCCESS:
+                            em.doWarn()
+                if retValue != ReturnCode.SUCCESS:
+                    break
+            else:
+                runner.drain()
+
     def doHelp(self, argv):
         if not argv:
             ldr = ms.settings['leader']
@@ -525,48 +676,11 @@ class MiniqueryApp():
     ############ Utilities / helper functions ############
 
     def _unravelAliases(self, cmd, leader):
-        strippedCmd = cmd.lstrip(leader)
-        for a in ms.aliases:
-            # We have an alias when the cmd "starts with" an alias.
-            # We have to recognize false "aliases" that are
-            # simply proper substrings of a longer command name
-            if strippedCmd.startswith(a):
-                try:
-                    isAlias = not strippedCmd[len(a)].isidentifier()
-                except IndexError:
-                    isAlias = True
-                if isAlias:
-                    cmd = cmd.replace(a, ms.aliases[a], 1)
-                    break
-        return cmd
+        return self._expander.expandAliases(cmd, leader, ms.aliases)
 
     def _unravelVariables(self, cmd):
-        while True:
-            # We accept {}-protected variable names as well as unprotected ones.
-            # For the latter, we will opt for the longest variable name, so that if
-            # both "a" and "ab" exist, then "$ab" is equivalent to ${ab} not ${a}b
-            protectedVariable = re.search(r'\${(\w+)}', cmd)
-            if protectedVariable:
-                varName = protectedVariable.group(1)
-                try:
-                    cmd = re.sub(re.escape(protectedVariable.group(0)), ms.variables[varName], cmd)
-                except KeyError:
-                    print('Unknown variable "' + varName + "'")
-                    return cmd
-            nakedVariable = re.search(r'\$(\w+)', cmd)
-            if nakedVariable and ms.variables:
-                containingString = nakedVariable.group(1)
-                maxNameVariable = ('','')
-                for var in ms.variables.items():
-                    if containingString.startswith(var[0]) and var[0].startswith(maxNameVariable[0]):
-                        maxNameVariable = var
-                if maxNameVariable[0]:
-                    cmd = re.sub(re.escape(nakedVariable.group(0)), maxNameVariable[1], cmd)
-
-            if not (protectedVariable or nakedVariable):
-                break
-
-        return cmd
+        # We accept {}-protected variable names as well as unprotected ones
+        return self._expander.expandVariables(cmd, ms.variables)
 
 
     def _chooseValueFromList(self, lst, category, setting, title, text, userEntry='',
@@ -601,6 +715,7 @@ class MiniqueryApp():
                 currentChoice = getattr(ms, category)[subcategory][setting]
             else:
                 currentChoice = getattr(ms, category)[setting]
+            from miniDialogs import button_dialog
             choice = button_dialog(title=title, text=text, buttons=buttonList,
                     initialChoice=currentChoice)
             if choice and choice >= 0:
@@ -639,6 +754,7 @@ class MiniqueryApp():
             else:
                 # Value assignment from dialog box
                 var = argv[0]
+                from miniDialogs import input_dialog
                 val = input_dialog(title='Set value',
                             text='Please enter a value for ' + var + ':')
                 if not val:
@@ -729,15 +845,27 @@ def main():
     # If the standard input has been redirected, execute its commands
     # and quickly exit, as in mysql
     if not ms.isInputTty:
+        # In batch mode, DML is grouped into transactions. "--force" keeps
+        # going past failed statements, as in mysql
+        continueOnError = '--force' in argv or ms.settings.as_bool('continueOnError')
+        if '--batch' in argv:
+            miniApp.runBatch(sys.stdin, continueOnError)
+            em.doExit()
+
         while True:
             cmd = sys.stdin.readline()
             if not cmd:
                 break
             retValue = miniApp.dispatchCommand(cmd)
 
-            # Exit early if there is an incident
-            if retValue != ReturnCode.SUCCESS:
+            # A quit command ends the run whatever continueOnError says.
+            # Otherwise exit early if there is an incident
+            if retValue == ReturnCode.USER_EXIT:
                 em.doExit()
+            elif retValue != ReturnCode.SUCCESS:
+                if not continueOnError:
+                    em.doExit()
+                em.resetError()
 
         # Exit at EOF
         em.doExit()
@@ -750,6 +878,18 @@ def main():
         miniApp.dispatchCommand(cmd)
         em.doExit()
 
+    # From here on the session is interactive: load the screen-handling modules
+    from prompt_toolkit import PromptSession, print_formatted_text
+    from prompt_toolkit.formatted_text import FormattedText
+    from prompt_toolkit.styles import Style
+    from prompt_toolkit.enums import EditingMode
+    from miniHistory import MiniFileHistory
+    from commandCompleter import CommandCompleter
+    from miniFrecency import FrecencyStore
+
+    # Start loading the table metadata in the background
+    dataConfig.startPrefetching(int(ms.settings['prefetchThreads']))
+
     # Display the introductory message
     welcomeColor = 'green' if ms.ostype == 'Windows' else 'lightgreen'
     print_formatted_text(FormattedText([(welcomeColor, '\nWELCOME TO MINIQUERY!\n')]))
@@ -760,6 +900,8 @@ def main():
     histFileName = os.path.join(env.HOME, '.mini_history')
     historyObject = MiniFileHistory(histFileName)
     miniApp.setHistory(historyObject)
+    # Completion candidates are ranked by how often and how lately they were used
+    frecencyStore = FrecencyStore(os.path.join(env.HOME, '.mini_frecency'))
 
     session = PromptSession(history=historyObject)
     from prompt_toolkit.key_binding.key_bindings import KeyBindings, merge_key_bindings
@@ -806,7 +948,7 @@ def main():
         try:
             while True:
                 print()
-                cmdCompleter = CommandCompleter([])
+                cmdCompleter = CommandCompleter([], frecency=frecencyStore)
 
                 editMode = ms.settings['editMode']
                 cmd = session.prompt(
@@ -838,10 +980,12 @@ def main():
         except EOFError:
             break
 
+        cmdCompleter.recordAccepted(cmd)
         retValue = miniApp.dispatchCommand(cmd)
         if retValue == ReturnCode.USER_EXIT:
             break
 
+    frecencyStore.save()
     em.doExit()
 
 
@@ -870,69 +1014,23 @@ def regularizeCommandLine(argv):
 def commandToWordList(cmd):
     '''
     Splits a command string into a list that can be arg-classify()'d.
-    This routine is custom-made to handle escape sequences and our subquery syntax.
+    The splitting, which handles escape sequences and our subquery syntax,
+    is done by tokenizeCommand().
     '''
-
-    QUOTES = '{"\'}'   # normal quotes plus subquery delimiters
-
-    word = ''
-    words = []
-    quoteBuffer = []    # Only track {}s and outermost quotes
-    isEscaped = False
-
-    for c in cmd:
-        if isEscaped or c == '\\':
-            # Escape sequences have greatest precedence and are left untouched
-            word += c
-            isEscaped = not isEscaped
-        elif c in QUOTES:
-            previousQuote = quoteBuffer[-1] if quoteBuffer else ''
-            if c == '"' or c == "'":
-                if '{' in quoteBuffer:
-                    # Inside {}, treat quotes as normal characters
-                    word += c
-                elif quoteBuffer:
-                    if c == previousQuote:
-                        # This is a close-quote. Toss it and unbuffer its partner.
-                        del quoteBuffer[-1]
-                    else:
-                        # This is a literal quote character inside a quoted sequence
-                        word += c
-                else:
-                    # This is an open-quote.
-                    quoteBuffer += c
-            elif c == '{':
-                # Track all {}s
-                quoteBuffer += c
-                word += c
-            else:   # c == '}'
-                if previousQuote == '{':
-                    del quoteBuffer[-1]
-                word += c
-        elif c.isspace():
-            if quoteBuffer:
-                # Preserve protected whitespace
-                word += c
-            elif word:
-                # Treat whitespace as word delimiter
-                words.append(word)
-                word = ''
-        else:
-            # Preserve normal characters
-            word += c
-
-    if word:
-        words.append(word)
-
-    if quoteBuffer:
-        em.setError(ReturnCode.UNBALANCED_PARENTHESES_OR_SYMBOLS, cmd)
+    tokens, unclosedAt = tokenizeCommand(cmd)
+    if unclosedAt >= 0:
+        # Point at the quote or brace left open
+        em.setError(ReturnCode.UNBALANCED_PARENTHESES_OR_SYMBOLS, cmd[unclosedAt:])
         return [cmd]
 
-    return words
+    return [token[0] for token in tokens]
 
 
 # Preserved to help test word completion:
 def doCompleter(argv):
+    from prompt_toolkit.completion import CompleteEvent
+    from prompt_toolkit.document import Document
+    from miniCompleter import MiniCompleter
     words = ['this','that','thought']
     comp = MiniCompleter(words)
     complete_event = CompleteEvent(completion_requested=False)    # from bindings/completion.py:51
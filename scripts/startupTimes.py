@@ -0,0 +1,75 @@
+'''
+Measure where MINIQUERY spends its start-up time, import by import.
+
+Runs mini.py under "python -X importtime" and summarizes the report that the
+interpreter writes to stderr. Any arguments are passed on to mini.py; with
+none, "-h" is used, which exits right after the module-level imports.
+
+    python startupTimes.py                 # import cost alone
+    python startupTimes.py -e "\\tables"    # a complete one-shot run
+'''
+import os
+import re
+import sys
+import time
+import subprocess
+
+TOP_COUNT = 25
+
+# "import time:       self [us] |  cumulative | imported package"
+IMPORT_TIME_RE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+def measureStartup(miniArgs):
+    '''
+    Run mini.py once and return (wall time in seconds, list of
+    (module, self us, cumulative us, nesting depth) in import order)
+    '''
+    scriptDir = os.path.dirname(os.path.abspath(__file__))
+    command = [sys.executable, '-X', 'importtime', 'mini.py'] + miniArgs
+    startTime = time.perf_counter()
+    completed = subprocess.run(command, cwd=scriptDir, stdin=subprocess.DEVNULL,
+                    stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    wallTime = time.perf_counter() - startTime
+
+    imports = []
+    for line in completed.stderr.splitlines():
+        m = IMPORT_TIME_RE.match(line)
+        if m:
+            selfTime, cumulative, indent, module = m.groups()
+            imports.append((module, int(selfTime), int(cumulative), (len(indent) - 1) // 2))
+    return wallTime, imports
+
+def summarize(wallTime, imports, outFile=None):
+    outFile = outFile or sys.stdout
+    totalSelf = sum(i[1] for i in imports)
+
+    # Per top-level package: the sum of the self times of all its modules
+    packages = {}
+    for (module, selfTime, cumulative, depth) in imports:
+        package = module.partition('.')[0]
+        packages[package] = packages.get(package, 0) + selfTime
+
+    print('Wall time: {:.1f} ms, of which imports: {:.1f} ms in {} modules'.format(
+            wallTime * 1000, totalSelf / 1000, len(imports)), file=outFile)
+
+    print('\nSlowest top-level packages (self time of all their modules):', file=outFile)
+    for (package, selfTime) in sorted(packages.items(), key=lambda p: -p[1])[:TOP_COUNT]:
+        print('  {:>9.1f} ms  {:5.1f}%  {}'.format(selfTime / 1000,
+                100.0 * selfTime / totalSelf if totalSelf else 0, package), file=outFile)
+
+    print('\nSlowest imports made directly by MINIQUERY modules (cumulative):', file=outFile)
+    direct = [i for i in imports if i[3] <= 1]
+    for (module, selfTime, cumulative, depth) in sorted(direct, key=lambda i: -i[2])[:TOP_COUNT]:
+        print('  {:>9.1f} ms  {}'.format(cumulative / 1000, module), file=outFile)
+
+def main():
+    miniArgs = sys.argv[1:] or ['-h']
+    wallTime, imports = measureStartup(miniArgs)
+    if not imports:
+        print('No import timings were reported; is this Python 3.7 or later?', file=sys.stderr)
+        return 1
+    summarize(wallTime, imports)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
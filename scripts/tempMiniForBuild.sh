@@ -33,6 +33,11 @@ includeImports=(
     queryProcessor
     databaseConnection
     prompts
+    batchExecutor
+    resultCache
+    commandTokenizer
+    commandExpander
+    parallelSource
 )
 utilIncludeImports=(
     miniCompleter
@@ -40,6 +45,8 @@ utilIncludeImports=(
     miniGlobals
     miniGlobals
     miniDialogs
+    miniHistory
+    miniFrecency
 )
 
 append_to_edit_command  "includes"      "${includeImports[@]}"
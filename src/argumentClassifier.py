@@ -9,45 +9,47 @@ from appSettings import miniSettings as ms, fakePass
 sys.path.append(".." + os.sep + "util")
 from miniGlobals import tqlCommands
 
+# Splits an argument into its prefix (leading non-word characters) and its
+# word, and finds the first modification operator (+= .= etc.) in the word,
+# in a single match. An argument without word characters is all prefix.
+ARGUMENT_LEXER_RE = re.compile(r'(\W*)(?:(\w(?:.*?(\W+=))?.*))?', re.S)
+# Operators like <= and != are comparisons, not modifiers
+NON_MODIFIER_OPERATORS = frozenset(['<=', '>=', '!=', '=='])
+SQ_OPTION_RE = re.compile(r'-+\w')
+
 class ArgumentClassifier:
     # Define the legal values for radio-button options
     RADIOSET_CONJUNCTIONS = {'a', 'o'}    # and/or
     RADIOSET_VALUE_LOGICS = {'2v', '3v'}  # 2- or 3-valued logic
     RADIOSET_EXECUTION_MODES = {'e', 'int'} # one-and-done or interactive
-    RADIOSET_DISPLAY_MODES = {'tab', 'wrap', 'nowrap', 'vertical'}
-    RADIO_OPTIONS_BY_SET = [(setId, opt) for (setId, options) in enumerate([
-                                    RADIOSET_CONJUNCTIONS,
-                                    RADIOSET_VALUE_LOGICS,
-                                    RADIOSET_EXECUTION_MODES,
-                                    RADIOSET_DISPLAY_MODES
-                                    ])
-                                for opt in options]
+    RADIOSET_DISPLAY_MODES = {'tab', 'wrap', 'nowrap', 'vertical', 'csv', 'ndjson', 'arrow'}
+    RADIO_SETS = [
+        RADIOSET_CONJUNCTIONS,
+        RADIOSET_VALUE_LOGICS,
+        RADIOSET_EXECUTION_MODES,
+        RADIOSET_DISPLAY_MODES
+        ]
+    # Each radio option mapped to the other options of its set, which it turns off
+    RADIO_COMPANIONS = {opt: tuple(options - {opt}) for options in RADIO_SETS for opt in options}
 
     class MiniOptions(dict):
         def __setitem__(self, option, value=None):
             '''
             Set/change an option while enforcing "radio button" exclusivity
             '''
-
-            # Find the radio group containing this option, if there is one
-            try:
-                groupIdOptionPair = [x for x in ArgumentClassifier.RADIO_OPTIONS_BY_SET if x[1] == option][0]
-                groupId = groupIdOptionPair[0]
+            companions = ArgumentClassifier.RADIO_COMPANIONS.get(option)
 
             # For non-radio-type options, do a quick set-and-return
-            except IndexError:
+            if companions is None:
                 dict.__setitem__(self, option, value)
                 return
 
-            # Get the whole radio button group
-            radioGroup = {x for x in ArgumentClassifier.RADIO_OPTIONS_BY_SET if x[0] == groupId}
             # Enforce radio behavior: Turn on the selected option and turn off its companions
-            for (groupId, opt) in radioGroup - {groupIdOptionPair}:
-                self.pop(opt, None)
+            for opt in companions:
+                if opt in self:
+                    dict.__delitem__(self, opt)
             dict.__setitem__(self, option, True)
 
-            return
-
         def copy(self):
             return ArgumentClassifier.MiniOptions(self)
 
@@ -124,6 +126,20 @@ class ArgumentClassifier:
             self._operator = operator
             self._position = position
 
+    class Token():
+        '''
+        One argument of a TQL command, lexed by a single match of
+        ARGUMENT_LEXER_RE: its prefix, its word, any modification operator
+        in the word, and whether it is an option (a prefix of dashes only).
+        '''
+        __slots__ = ('prefix', 'word', 'operator', 'isOption')
+
+        def __init__(self, arg):
+            self.prefix, word, operator = ARGUMENT_LEXER_RE.fullmatch(arg).groups()
+            self.word = word or ''
+            self.isOption = bool(word) and self.prefix != '' and not self.prefix.strip('-')
+            self.operator = operator if operator not in NON_MODIFIER_OPERATORS else None
+
     def classify(self, argList, leader):
         '''
         Determine whether the arguments denote a System Command or a Query Command,
@@ -167,7 +183,7 @@ class ArgumentClassifier:
         # SQL in that order with nothing else allowed.
         if self._commandName == 'sq':
             for idx, arg in enumerate(argList):
-                if re.match('-+\w', arg):
+                if SQ_OPTION_RE.match(arg):
                     op, eq, vl = arg.lstrip('-').partition('=')
                     self._options[op] = vl
                 else:
@@ -186,35 +202,31 @@ class ArgumentClassifier:
             # Walk the argument list, accumulating arguments into lists
             # by their prefix (including options, whose
             # prefix is '-') and take note of operators (+= := etc.)
+            argumentTree = self._argumentTree
             for arg in argList:
-
-                # Separate prefix and word
-                m = re.fullmatch(r'(\W*)(\w.*)', arg)
-                prefix, word = m.groups()
+                token = self.Token(arg)
+                prefix, word = token.prefix, token.word
 
                 # If an option, process and continue
-                if re.fullmatch(r'-+', prefix):
+                if token.isOption:
                     op, eq, vl = word.partition('=')
                     self._options[op] = vl
                     continue
 
-                # Make note of any modification operators inside the arguments.
-                # These include += .= etc. Operators like <= and != are not modifiers.
-                m = re.search(r'\W+=', word)
-                operator = m.group(0) if m else None
-                if operator and operator not in ['<=', '>=', '!=', '==']:
-                    cellNumber = len(self._argumentTree[prefix]) if self._argumentTree.get(prefix) else 0
-                    self._operators.append(self.Operator(operator, cellNumber))
+                # Make note of any modification operators inside the arguments,
+                # at the position the argument is about to take under its prefix
+                cells = argumentTree.get(prefix)
+                if token.operator:
+                    self._operators.append(self.Operator(token.operator, len(cells) if cells else 0))
 
                 # For query commands, if the table is not set the first non-prefix argument is table name
                 if self._isQueryCommand and not prefix and not self._mainTableName:
                     self._mainTableName = word
                 # Otherwise store the argument in the prefix-based classification tree
+                elif cells:
+                    cells.append(word)
                 else:
-                    if not self._argumentTree.get(prefix):
-                        self._argumentTree[prefix] = [word]
-                    else:
-                        self._argumentTree[prefix].append(word)
+                    argumentTree[prefix] = [word]
 
         # Kluge: For the password, give the option precedence over
         # the config setting. The code that cares about this is in databaseCxn.py
@@ -0,0 +1,157 @@
+import re
+import sys
+import time
+from decimal import Decimal
+from sqlalchemy.sql import text
+from sqlalchemy.exc import DBAPIError
+
+from databaseConnection import miniDbConnection; dbConn = miniDbConnection
+from resultCache import miniResultCache; resultCache = miniResultCache
+from errorManager import miniErrorManager, ReturnCode; em = miniErrorManager
+
+class BatchExecutor:
+    '''
+    Runs literal DML statements in bulk for non-interactive input. Statements
+    are accumulated and committed together, batchSize at a time, in a single
+    transaction. Within a batch, consecutive statements that differ only in
+    their literal values share a "shape" and are sent with one executemany().
+
+    On a failed batch the transaction is rolled back. With continueOnError the
+    batch is then replayed one statement at a time so that only the offending
+    statements are lost; otherwise the error is returned to the caller.
+    '''
+
+    DML_KEYWORDS = ['insert', 'update', 'delete', 'replace']
+
+    # Literals that can be turned into bind parameters: simple single-quoted
+    # strings and unsigned numbers standing on their own
+    LITERAL_RE = re.compile(r"'((?:[^'\\]|'')*)'|(?<![\w.`$])(\d+(?:\.\d+)?)(?![\w.`])")
+
+    def __init__(self, batchSize, continueOnError=False, reportFile=None):
+        self._batchSize = batchSize
+        self._continueOnError = continueOnError
+        self._reportFile = reportFile or sys.stderr
+        self._pending = []
+        self.batchCount = 0
+        self.statementCount = 0
+        self.failureCount = 0
+        self.elapsedTime = 0.0
+
+    @classmethod
+    def isBatchable(cls, sql):
+        return sql.partition(' ')[0].lower() in cls.DML_KEYWORDS
+
+    def add(self, sql):
+        self._pending.append(sql)
+        if len(self._pending) >= self._batchSize:
+            return self.flush()
+        return ReturnCode.SUCCESS
+
+    def flush(self):
+        '''
+        Execute and commit the pending statements
+        '''
+        if not self._pending:
+            return ReturnCode.SUCCESS
+        statements, self._pending = self._pending, []
+
+        conn = dbConn.getConnection()
+        if em.getError() != ReturnCode.SUCCESS:
+            return em.getError()
+
+        startTime = time.perf_counter()
+        failures = 0
+        transaction = conn.begin()
+        try:
+            for (shape, paramList) in self._groupByShape(statements):
+                if paramList:
+                    conn.execute(text(shape), paramList)
+                else:
+                    conn.execute(text(shape))
+            transaction.commit()
+        except DBAPIError as e:
+            transaction.rollback()
+            if not self._continueOnError:
+                return em.setException(e, "Error/exception thrown by %s driver" % dbConn.getDialect())
+            failures = self._replayIndividually(conn, statements)
+        elapsedTime = time.perf_counter() - startTime
+
+        for sql in statements:
+            resultCache.invalidate(sql)
+
+        self.batchCount += 1
+        self.statementCount += len(statements)
+        self.failureCount += failures
+        self.elapsedTime += elapsedTime
+        self._report('Batch %d' % self.batchCount, len(statements), failures, elapsedTime)
+        return ReturnCode.SUCCESS
+
+    def reportTotals(self):
+        if self.batchCount > 1:
+            self._report('Total', self.statementCount, self.failureCount, self.elapsedTime)
+
+    def _report(self, label, count, failures, elapsedTime):
+        rate = count / elapsedTime if elapsedTime > 0 else float('inf')
+        print('{}: {} statements in {:.3f}s ({:.0f}/s){}'.format(label, count, elapsedTime, rate,
+                ', %d failed' % failures if failures else ''), file=self._reportFile)
+
+    def _replayIndividually(self, conn, statements):
+        failures = 0
+        for (lineNumber, sql) in enumerate(statements, 1):
+            transaction = conn.begin()
+            try:
+                conn.execute(text(self._escapeColons(sql)))
+                transaction.commit()
+            except DBAPIError as e:
+                transaction.rollback()
+                failures += 1
+                em.setException(e, "Batch %d, statement %d failed" % (self.batchCount + 1, lineNumber))
+                em.doWarn()
+        return failures
+
+    @classmethod
+    def _groupByShape(cls, statements):
+        '''
+        Group runs of consecutive statements having the same shape. Returns a
+        list of (shape, parameter list) pairs; the parameter list is empty for
+        statements that could not be parameterized.
+        '''
+        groups = []
+        for sql in statements:
+            shape, params = cls._parameterize(sql)
+            if params is not None and groups and groups[-1][0] == shape and groups[-1][1]:
+                groups[-1][1].append(params)
+            else:
+                groups.append((shape, [params] if params is not None else []))
+        return groups
+
+    @classmethod
+    def _parameterize(cls, sql):
+        '''
+        Replace the literals of a statement by bind parameters. Returns the
+        shape and the parameter dict, or the (escaped) statement and None when
+        the statement has quoting we do not try to take apart.
+        '''
+        if '\\' in sql or '"' in sql:
+            return cls._escapeColons(sql), None
+
+        params = {}
+        pieces = []
+        position = 0
+        for m in cls.LITERAL_RE.finditer(sql):
+            name = 'p%d' % len(params)
+            string, number = m.groups()
+            if number is not None:
+                params[name] = int(number) if '.' not in number else Decimal(number)
+            else:
+                params[name] = string.replace("''", "'")
+            pieces.append(cls._escapeColons(sql[position:m.start()]))
+            pieces.append(':' + name)
+            position = m.end()
+        pieces.append(cls._escapeColons(sql[position:]))
+        return ''.join(pieces), params
+
+    @staticmethod
+    def _escapeColons(sql):
+        # Keep text() from taking colons in the statement for bind parameters
+        return sql.replace(':', '\\:')
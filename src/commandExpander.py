@@ -0,0 +1,110 @@
+import re
+
+# A variable reference: ${name}, or $ followed by a run of word characters
+# that starts with the name
+VARIABLE_REFERENCE_RE = re.compile(r'\$\{(\w+)\}|\$(\w+)')
+
+class _nameTable:
+    '''
+    The names of a settings section (aliases or variables), grouped by
+    length, for longest-match lookups. The longest name that is a prefix of
+    some text is found by probing the section with the prefixes of each name
+    length present, longest first: a handful of hash lookups however many
+    names there are.
+    '''
+    def __init__(self, section):
+        self.section = section
+        self.version = section._version
+        self.lengths = sorted({len(name) for name in section}, reverse=True)
+
+    def isCurrent(self, section):
+        return section is self.section and section._version == self.version
+
+    def longestPrefix(self, text, start=0, isBoundary=None):
+        '''
+        The longest name that text[start:] starts with, and whose end satisfies
+        isBoundary(text, end) if given, or None.
+        '''
+        available = len(text) - start
+        for length in self.lengths:
+            if length <= available:
+                name = text[start:start+length]
+                if name in self.section and (isBoundary is None or isBoundary(text, start+length)):
+                    return name
+        return None
+
+class CommandExpander:
+    '''
+    Expands the aliases and variables of a command line.
+
+    The lookup tables are derived from the Aliases and Variables sections and
+    rebuilt only when a section changes (seta/setv/unseta/unsetv bump its
+    version). Variables are replaced in a single left-to-right pass. The value
+    of a variable is expanded in turn, up to MAX_DEPTH levels deep. A variable
+    that refers back to itself is reported, not expanded.
+    '''
+
+    MAX_DEPTH = 16
+
+    def __init__(self):
+        self._aliasTable = None
+        self._variableTable = None
+
+    @staticmethod
+    def _endsAliasName(text, end):
+        # An alias must not be a proper prefix of a longer command name
+        return end == len(text) or not text[end].isidentifier()
+
+    def expandAliases(self, cmd, leader, aliases):
+        ''' Replace the longest alias the command starts with, after the leader '''
+        if self._aliasTable is None or not self._aliasTable.isCurrent(aliases):
+            self._aliasTable = _nameTable(aliases)
+        start = len(cmd) - len(cmd.lstrip(leader))
+        alias = self._aliasTable.longestPrefix(cmd, start, self._endsAliasName)
+        if alias is None:
+            return cmd
+        return cmd[:start] + aliases[alias] + cmd[start+len(alias):]
+
+    def expandVariables(self, cmd, variables):
+        if self._variableTable is None or not self._variableTable.isCurrent(variables):
+            self._variableTable = _nameTable(variables)
+        if '$' not in cmd:
+            return cmd
+        return self._expand(cmd, variables, [])
+
+    def _expand(self, text, variables, expanding):
+        '''
+        Expand the variable references in text. expanding lists the variables
+        whose values are being expanded, outermost first.
+        '''
+        def substitute(m):
+            protectedName, nakedName = m.groups()
+            if protectedName is not None:
+                if protectedName not in variables:
+                    print('Unknown variable "' + protectedName + '"')
+                    return m.group(0)
+                name, rest = protectedName, ''
+            else:
+                # Opt for the longest variable name, so that if both "a" and
+                # "ab" exist, then "$ab" is equivalent to ${ab} not ${a}b
+                name = self._variableTable.longestPrefix(nakedName)
+                if name is None:
+                    return m.group(0)
+                rest = nakedName[len(name):]
+
+            if name in expanding:
+                print('Variable "{}" refers to itself: {}'.format(name,
+                            ' -> '.join(expanding[expanding.index(name):] + [name])))
+                return m.group(0)
+            if len(expanding) >= self.MAX_DEPTH:
+                print('Variable "{}" nested more than {} levels deep'.format(name, self.MAX_DEPTH))
+                return m.group(0)
+
+            value = variables[name]
+            if '$' in value:
+                expanding.append(name)
+                value = self._expand(value, variables, expanding)
+                expanding.pop()
+            return value + rest
+
+        return VARIABLE_REFERENCE_RE.sub(substitute, text)
@@ -0,0 +1,114 @@
+import re
+
+# A word outside quotes and braces, in the common case: plain characters,
+# escapes, and quoted strings and {} subqueries holding no escapes or nesting,
+# up to the next whitespace. Each such word is a single match.
+COMMAND_SIMPLE_WORD_RE = re.compile(r'''\s*((?:[^\s\\'"{}]|'[^'\\{]*'|"[^"\\{]*"|\{[^{}\\]*\}|\\.)+)(?=\s|\Z)''', re.S)
+# The parts of a simple word; the quotes around a quoted string are dropped
+COMMAND_WORD_PART_RE = re.compile(r'''[^\\'"{]+|'([^'\\{]*)'|"([^"\\{]*)"|\{[^{}\\]*\}|\\.''', re.S)
+
+# Everything else is scanned a stretch at a time: the longest run of
+# characters that mean nothing special in the current state, then one
+# special character
+COMMAND_PLAIN_RUN_RES = {
+    '':  re.compile(r'''[^\s\\'"{}]+'''),   # outside quotes and braces
+    "'": re.compile(r"[^'{\\]+"),           # inside '...'
+    '"': re.compile(r'[^"{\\]+'),           # inside "..."
+    '{': re.compile(r'[^{}\\]+'),           # inside {...}, where quotes are plain
+}
+COMMAND_SPACE_RE = re.compile(r'\s+')
+
+def _wordFromParts(word):
+    return ''.join([part.group(part.lastindex) if part.lastindex else part.group()
+                        for part in COMMAND_WORD_PART_RE.finditer(word)])
+
+def tokenizeCommand(cmd):
+    '''
+    Split a command line into words, honoring the quoting rules of MINIQUERY:
+
+    - A backslash and the character after it are taken literally, and kept.
+    - Quotes protect whitespace and are dropped, except that the other kind
+      of quote, and any quote inside {}, is an ordinary character.
+    - A {} subquery, which may nest, protects whitespace and keeps its braces.
+
+    The line is scanned once, left to right, a run of characters at a time,
+    and every word is assembled from slices of the line.
+    Returns (tokens, unclosedAt): a list of (word, start, end) tuples, where
+    [start, end) is the word's span in the line, quotes included, and the
+    offset of the quote or outermost brace left open at the end, or -1.
+    '''
+    tokens = []
+    pieces = []             # slices making up the current word
+    wordStart = -1          # offset of the current word, -1 between words
+    quote = ''              # the open quote character, if any
+    quoteStart = -1
+    braceStarts = []        # offsets of the open braces
+    position = 0
+    length = len(cmd)
+    matchSimpleWord = COMMAND_SIMPLE_WORD_RE.match
+
+    while position < length:
+        state = '{' if braceStarts else quote
+        if not state and wordStart < 0:
+            # Between words: take the simple words ahead, one match each
+            m = matchSimpleWord(cmd, position)
+            while m:
+                word = m.group(1)
+                if "'" in word or '"' in word:
+                    word = _wordFromParts(word)
+                # An empty quoted string is no word
+                if word:
+                    tokens.append((word, m.start(1), m.end()))
+                position = m.end()
+                m = matchSimpleWord(cmd, position)
+            if position >= length:
+                break
+
+        m = COMMAND_PLAIN_RUN_RES[state].match(cmd, position)
+        if m:
+            if wordStart < 0:
+                wordStart = position
+            pieces.append(m.group())
+            position = m.end()
+            continue
+
+        c = cmd[position]
+        if c.isspace():
+            # Only special outside quotes and braces: the word ends
+            if pieces:
+                tokens.append((''.join(pieces), wordStart, position))
+                pieces = []
+            wordStart = -1
+            position = COMMAND_SPACE_RE.match(cmd, position).end()
+            continue
+
+        if wordStart < 0:
+            wordStart = position
+        if c == '\\':
+            pieces.append(cmd[position:position+2])
+            position += 2
+            continue
+        if c == '{':
+            braceStarts.append(position)
+            pieces.append(c)
+        elif c == '}':
+            if braceStarts:
+                braceStarts.pop()
+            pieces.append(c)
+        elif braceStarts or (quote and c != quote):
+            pieces.append(c)
+        elif quote:
+            quote = ''
+        else:
+            quote = c
+            quoteStart = position
+        position += 1
+
+    if pieces:
+        tokens.append((''.join(pieces), wordStart, length))
+
+    if quote:
+        unclosedAt = min([quoteStart] + braceStarts[:1])
+    else:
+        unclosedAt = braceStarts[0] if braceStarts else -1
+    return tokens, unclosedAt
@@ -2,8 +2,12 @@ import sys
 import os
 import re
 import subprocess
+import datetime
+import threading
+from array import array
 from enum import Enum
 from sqlalchemy.sql import text
+from sqlalchemy.exc import DBAPIError
 
 import miniEnv as env
 from appSettings import miniSettings; ms = miniSettings
@@ -11,6 +15,11 @@ from miniUtils import sqlTypeToInternalType
 from errorManager import miniErrorManager, ReturnCode; em = miniErrorManager
 from expanderEngine import miniExpanderEngine; exp = miniExpanderEngine
 from databaseConnection import miniDbConnection; dbConn = miniDbConnection
+from schemaCache import openSchemaCache
+from schemaRefresh import refreshSchemaCache, loadSchema, readCachedColumns
+from nameIndex import SubsequenceIndex, ColumnIndex
+from schemaPrefetcher import SchemaPrefetcher
+from joinGraph import JoinGraph
 
 class RegexType(Enum):
     NORMAL = 0
@@ -20,6 +29,161 @@ class RegexType(Enum):
     DEFAULT_DATE = 4
     DELETED = 5
 
+class ValidationRules:
+    '''
+    A table's argument-validation rules, compiled once when the table config
+    is loaded. The rules are held in parallel arrays indexed by rule number:
+    compiled patterns, rule types, and the lower/upper bounds pre-parsed to
+    floats (lengths for alpha rules, values for numeric rules, day ordinals
+    for date rules), so that no string parsing happens at query time.
+    '''
+
+    def __init__(self):
+        self.patterns = []
+        self.types = array('b')
+        self.lowerBounds = array('d')
+        self.upperBounds = array('d')
+        self.columns = []
+        self.columnTypes = []
+
+    def __len__(self):
+        return len(self.patterns)
+
+    @classmethod
+    def fromConfig(cls, config):
+        ''' Build the rules from the regexN, lowerBoundsN etc. entries of a table config '''
+        rules = cls()
+        for i in range(config.get('regexCount', 0)):
+            sCount = str(i)
+            regexType = config.get('regexType' + sCount)
+            if regexType is None or regexType == RegexType.DELETED:
+                continue
+            rules.add(config['regex' + sCount], regexType,
+                        config.get('lowerBounds' + sCount, ''),
+                        config.get('upperBounds' + sCount, ''),
+                        config.get('column' + sCount, ''),
+                        config.get('columnType' + sCount))
+        return rules
+
+    def add(self, regex, regexType, lowerBound='', upperBound='', column='', columnType=None):
+        try:
+            pattern = re.compile(regex)
+            lower = self._parseBound(lowerBound, regexType, float('-inf'))
+            upper = self._parseBound(upperBound, regexType, float('inf'))
+        except (re.error, ValueError):
+            # A malformed rule can never be satisfied, so leave it out
+            return
+        self.patterns.append(pattern)
+        self.types.append(regexType.value)
+        self.lowerBounds.append(lower)
+        self.upperBounds.append(upper)
+        self.columns.append(column)
+        self.columnTypes.append(columnType)
+
+    @staticmethod
+    def _parseBound(bound, regexType, default):
+        if not bound:
+            return default
+        if regexType == RegexType.DEFAULT_DATE:
+            return float(_dateToOrdinal(bound))
+        return float(bound)
+
+    def classify(self, particle):
+        '''
+        Return the numbers of the rules the particle satisfies, in a single pass.
+        The particle is converted to a number or a date at most once.
+        '''
+        ALPHA = RegexType.DEFAULT_ALPHA.value
+        DATE = RegexType.DEFAULT_DATE.value
+        NUMERIC = (RegexType.DEFAULT_INT.value, RegexType.DEFAULT_FLOAT.value)
+        number = date = None
+        matches = []
+        for i, pattern in enumerate(self.patterns):
+            if not pattern.match(particle):
+                continue
+            regexType = self.types[i]
+            try:
+                if regexType == ALPHA:
+                    measure = len(particle)
+                elif regexType in NUMERIC:
+                    if number is None:
+                        number = float(particle)
+                    measure = number
+                elif regexType == DATE:
+                    if date is None:
+                        date = _dateToOrdinal(particle)
+                    measure = date
+                else:
+                    matches.append(i)
+                    continue
+            except ValueError:
+                # Shaped like a number or a date but not one, e.g. 2023-02-30
+                continue
+            if self.lowerBounds[i] <= measure <= self.upperBounds[i]:
+                matches.append(i)
+        return matches
+
+def _dateToOrdinal(dateString):
+    '''
+    Day number of a date written as Y/M/D or Y-M-D. Raises ValueError if
+    it is not a real date.
+    '''
+    return datetime.date(*[int(x) for x in re.split('[/-]', dateString)]).toordinal()
+
+class ConfigFileIndex:
+    '''
+    The lines of a DB config file, grouped by section in a single pass.
+    One index is kept per file and it is re-parsed only when the file's
+    modification time changes, e.g. after saveConfigChanges().
+    '''
+
+    _indexes = {}
+
+    @classmethod
+    def get(cls, configFile):
+        index = cls._indexes.get(configFile)
+        if not index:
+            index = cls._indexes[configFile] = ConfigFileIndex(configFile)
+        return index
+
+    def __init__(self, configFile):
+        self.configFile = configFile
+        self._mtime = None
+        self._sections = None
+        self.missingReported = False    # say once, not once per table, that the file is missing
+
+    def sections(self):
+        '''
+        Dictionary of section name -> list of the section's stripped, non-empty,
+        non-comment lines. None if the file does not exist.
+        '''
+        try:
+            mtime = os.path.getmtime(self.configFile)
+        except OSError:
+            self._mtime = self._sections = None
+            return None
+        if mtime != self._mtime:
+            self._sections = self._parse()
+            self._mtime = mtime
+        return self._sections
+
+    def _parse(self):
+        sections = {}
+        currentSection = None
+        with open(self.configFile, 'r') as configFp:
+            for line in configFp:
+                line = line.strip()
+                if line.startswith('['):
+                    sectionName = line[1:].partition(']')[0]
+                    # As with a top-down scan, the first of any duplicate sections wins
+                    if sectionName in sections:
+                        currentSection = None
+                    else:
+                        currentSection = sections[sectionName] = []
+                elif currentSection is not None and line and not line.startswith('#'):
+                    currentSection.append(line)
+        return sections
+
 class MasterDataConfig:
     '''
     Umbrella class that stores both the schematic information and the user
@@ -32,6 +196,7 @@ class MasterDataConfig:
         # Set up a dictionary for the DB-specific configs
         self.databases = {}
         self.activeDatabase = None
+        self._prefetcher = None
         # Make client explicitly call setup(). He should wait until
         # the app settings are ready
         #self.setup()
@@ -54,8 +219,41 @@ class MasterDataConfig:
         ''' Lazy-load and point to the new main DB when it changes '''
         if not self.databases.get(dbName):
             self.databases[dbName] = DatabaseConfig(dbName)
+        if self._prefetcher:
+            self._prefetcher.prefetch(self.databases[dbName])
         return self.databases[dbName]
 
+    def startPrefetching(self, maxWorkers):
+        '''
+        From now on, load the tables of the active database in the background,
+        using up to maxWorkers threads. Meant for interactive sessions, which
+        live long enough to profit from it.
+        '''
+        if maxWorkers > 0 and not self._prefetcher:
+            self._prefetcher = SchemaPrefetcher(maxWorkers)
+            self._prefetcher.prefetch(self.activeDatabase)
+
+    def refreshDatabase(self, dbName, full=False):
+        '''
+        Re-sync the schema cache of a database with the server and reload it.
+        Returns the lists of refetched and dropped tables, or None on error.
+        '''
+        try:
+            changed, dropped = refreshSchemaCache(dbConn.getConnection(), dbName, full)
+        except DBAPIError as ex:
+            em.setException(ex, 'Unable to refresh the schema cache of database "%s"' % dbName)
+            return None
+        except OSError as ex:
+            em.setError(ReturnCode.FILE_NOT_WRITABLE,
+                    msgOverride='Unable to write the schema cache of database "{}": {}'.format(dbName, ex))
+            return None
+        dbConfig = self.databases.get(dbName)
+        if dbConfig:
+            dbConfig.reloadSchema(changed + dropped)
+            if self._prefetcher and dbConfig is self.activeDatabase:
+                self._prefetcher.prefetch(dbConfig)
+        return changed, dropped
+
     def setup(self):
         ''' Load the list of DB names and the config of the main DB '''
         filename = "{}/{}".format(env.MINI_CACHE, 'databases')
@@ -68,8 +266,8 @@ class MasterDataConfig:
 class DatabaseConfig:
     '''
     Wrapper to hold a list of table names plus configs for each table.
-    TODO: Add a ChainMap to group the table's column names together in one view.
-    This would help tremendously with completion in auto-join situations.
+    The column names of all tables are grouped in one view by columnIndex(),
+    for completion in auto-join situations.
     '''
 
     DB_CONFIG_SECTION_HEADER = 'DBCONFIG'
@@ -78,7 +276,14 @@ class DatabaseConfig:
         self.dbName = dbName
         self.config = {}
         self.tableNames = []
-        self.tables = {}
+        self.tables = {}    # replaced as a whole by publishTables(), never changed in place
+        self._tablesLock = threading.Lock()
+        self.schemaGeneration = 0    # bumped by reloadSchema(), under _tablesLock
+        self._bulkColumns = None    # every table's columns, once fetched by bulkLoadTables()
+        self._bulkLoadLock = threading.Lock()
+        self._columnIndex = None    # built on first use by columnIndex()
+        self.schemaCache = None    # binary, memory-mapped schema cache if available
+        self.tableIndex = SubsequenceIndex()    # for completion of table names
 
         # Track which config attributes have changed since the last save, and whether to save them.
         # This will tell us how the next save operation has to touch the DB config file.
@@ -91,21 +296,25 @@ class DatabaseConfig:
         self.setup()
 
     def loadTableNames(self, tableListFile):
-        try:
-            # Create a list of table names
-            with open(tableListFile, 'r') as tablesFp:
-                self.tableNames = [l.rstrip() for l in tablesFp]
-
-        except FileNotFoundError:
-            query = "SELECT {} FROM {} WHERE {} = '{}'".format(
-                        "table_name",
-                        "information_schema.tables",
-                        "table_schema",
-                        self.dbName)
-
-            resultSet = dbConn.getConnection().execute(text(query))
-            self.tableNames = resultSet.fetchall()   # list of tuples
-
+        if self.schemaCache:
+            self.tableNames = self.schemaCache.tableNames()
+        else:
+            try:
+                # Create a list of table names
+                with open(tableListFile, 'r') as tablesFp:
+                    self.tableNames = [l.rstrip() for l in tablesFp]
+
+            except FileNotFoundError:
+                query = "SELECT {} FROM {} WHERE {} = '{}'".format(
+                            "table_name",
+                            "information_schema.tables",
+                            "table_schema",
+                            self.dbName)
+
+                resultSet = dbConn.getConnection().execute(text(query))
+                self.tableNames = [row[0] for row in resultSet.fetchall()]
+
+        self.tableIndex.update(self.tableNames)
         return ReturnCode.SUCCESS
 
     def changeAnchorTable(self, anchorTableName):
@@ -115,22 +324,123 @@ class DatabaseConfig:
 
         if not self.tables.get(anchorTableName):
             # Table not loaded. Time to lazy-load it.
-            self.tables[anchorTableName] = TableConfig(anchorTableName, self)
+            self.publishTables({anchorTableName: TableConfig(anchorTableName, self)})
 
         self.configChanges['anchorTable'] = True    # format={attrName : bDoSave}
         self.config['anchorTable'] = anchorTableName
         return ReturnCode.SUCCESS
 
     def setup(self):
+        self.schemaCache = openSchemaCache("{}/{}".format(env.MINI_CACHE, self.dbName))
         filename = "{}/{}/{}".format(env.MINI_CACHE, self.dbName, 'information_schema.tables')
         self.loadTableNames(filename)
         # When initializing a DB, go ahead and initialize its anchor table
         self.config = self.readDatabaseConfig()
         anchorTableName = self.config.get('anchorTable')
         if anchorTableName:
-            self.tables[anchorTableName] = TableConfig(anchorTableName, self)
+            self.publishTables({anchorTableName: TableConfig(anchorTableName, self)})
         return ReturnCode.SUCCESS
 
+    def loadTable(self, tableName, connection=None):
+        ''' Build the config of a table without publishing it '''
+        return TableConfig(tableName, self, connection)
+
+    def bulkLoadTables(self, connection=None):
+        '''
+        Fetch the columns of all tables in one query instead of one query per
+        table, write them to the on-disk cache, and publish a config for every
+        table not loaded yet. Done at most once, on the first table whose
+        columns are not cached. Returns a dict of table name -> columns.
+        '''
+        with self._bulkLoadLock:
+            if self._bulkColumns is None:
+                self._bulkColumns = loadSchema(connection or dbConn.getConnection(), self.dbName)
+                self.schemaCache = openSchemaCache("{}/{}".format(env.MINI_CACHE, self.dbName))
+                tables = self.tables
+                self.publishTables(dict((tableName, TableConfig(tableName, self, columns=columns))
+                            for (tableName, columns) in self._bulkColumns.items()
+                            if tableName not in tables))
+        return self._bulkColumns
+
+    def publishTables(self, tableConfigs, schemaGeneration=None):
+        '''
+        Add table configs to self.tables. The dict is copied and swapped in
+        rather than changed in place, so a reader on any thread sees either
+        the old or the new set of tables, never a dict being modified.
+        Tables already loaded are kept.
+
+        Configs loaded in the background pass the schemaGeneration they were
+        loaded under; they are dropped if the schema was reloaded meanwhile.
+        '''
+        with self._tablesLock:
+            if schemaGeneration is not None and schemaGeneration != self.schemaGeneration:
+                return
+            tables = dict(self.tables)
+            for (tableName, tableConfig) in tableConfigs.items():
+                if tableName not in tables:
+                    tables[tableName] = tableConfig
+                    if self._columnIndex is not None:
+                        self._columnIndex.setTable(tableName, tableConfig.columnNames)
+            self.tables = tables
+
+    def reloadSchema(self, changedTables):
+        '''
+        Pick up a refreshed schema cache. The configs of changed or dropped
+        tables are discarded, to be lazy-loaded again when next needed.
+        '''
+        self.schemaCache = openSchemaCache("{}/{}".format(env.MINI_CACHE, self.dbName))
+        self._bulkColumns = None
+        filename = "{}/{}/{}".format(env.MINI_CACHE, self.dbName, 'information_schema.tables')
+        self.loadTableNames(filename)
+        changedTables = set(changedTables)
+        currentTables = set(self.tableNames)
+        with self._tablesLock:
+            self.schemaGeneration += 1
+            self.tables = dict((tableName, tableConfig) for (tableName, tableConfig) in self.tables.items()
+                                if tableName in currentTables and tableName not in changedTables)
+            if self._columnIndex is not None:
+                for tableName in changedTables:
+                    columns = self._cachedColumns(tableName) if tableName in currentTables else None
+                    if columns:
+                        self._columnIndex.setTable(tableName, columns)
+                    else:
+                        self._columnIndex.removeTable(tableName)
+        anchorTableName = self.config.get('anchorTable')
+        if anchorTableName in currentTables:
+            self.publishTables({anchorTableName: TableConfig(anchorTableName, self)})
+        return ReturnCode.SUCCESS
+
+    def _cachedColumns(self, tableName):
+        tableConfig = self.tables.get(tableName)
+        if tableConfig:
+            return tableConfig.columnNames
+        return readCachedColumns("{}/{}".format(env.MINI_CACHE, self.dbName), self.schemaCache, tableName)
+
+    def columnIndex(self):
+        '''
+        The index of the columns of all tables, built from the schema cache on
+        first use and kept up to date as tables are loaded or refreshed
+        '''
+        with self._tablesLock:
+            if self._columnIndex is None:
+                columnIndex = ColumnIndex()
+                for tableName in self.tableNames:
+                    columns = self._cachedColumns(tableName)
+                    if columns:
+                        columnIndex.setTable(tableName, columns)
+                self._columnIndex = columnIndex
+        return self._columnIndex
+
+    def joinGraph(self):
+        ''' The foreign-key join graph of the database, reloaded when its cache file changes '''
+        return JoinGraph.get("{}/{}".format(env.MINI_CACHE, self.dbName))
+
+    def columnsAreCached(self, tableName):
+        ''' Whether a table's columns can be loaded without querying the server '''
+        if self.schemaCache and self.schemaCache.columns(tableName):
+            return True
+        return os.path.isfile("{}/{}/{}.columns".format(env.MINI_CACHE, self.dbName, tableName))
+
     def readDatabaseConfig(self):
         ''' Reads the db-level config settings atop the config file '''
         configFile = "{}/{}.cfg".format(env.MINI_CONFIG, self.dbName)
@@ -240,16 +550,28 @@ class TableConfig:
     '''
     Wrapper to hold list of column names AND the user settings for a single table.
     '''
-    def __init__(self, tableName, parent):
+    def __init__(self, tableName, parent, connection=None, columns=None):
         self.config = {'standardColumns':'', 'primaryColumn':''} if tableName else {}
         self.tableName = tableName
         self.columnNames = []
+        self.columnIndex = SubsequenceIndex()    # for completion of column names
+        self.rules = ValidationRules()
         self.parent = parent     # reference to the containing db
         if self.tableName:
-            self.setup()
+            self.setup(connection, columns)
         return
 
-    def loadColumnNames(self, columnListFile,  metadataType = ''):
+    def loadColumnNames(self, columnListFile,  metadataType = '', connection=None):
+        # Prefer the binary schema cache. An empty column list means the
+        # table's columns were never cached, so fall through in that case.
+        schemaCache = self.parent.schemaCache if not metadataType else None
+        if schemaCache:
+            columns = schemaCache.columns(self.tableName)
+            if columns:
+                self.columnNames = columns
+                self.columnIndex.update([c[0] for c in self.columnNames])
+                return ReturnCode.SUCCESS
+
         try:
             # Create a list of size-3 tuples
             with open(columnListFile, 'r') as columnsFp:
@@ -257,33 +579,35 @@ class TableConfig:
 
         except FileNotFoundError:
             if metadataType:
-                tableSchema = "information_schema"
-                tableName = metadataType
+                query = "SELECT {} FROM {} WHERE {} = '{}' AND {} = '{}'".format(
+                        'column_name, column_type, column_default',
+                        'information_schema.columns',
+                        'table_schema', 'information_schema',
+                        'table_name', metadataType)
+
+                resultSet = (connection or dbConn.getConnection()).execute(text(query))
+                self.columnNames = resultSet.fetchall()   # list of tuples
             else:
-                tableSchema = env.MINI_DBNAME
-                tableName = re.search(r'(.*)\.columns$', columnListFile).group(1)
-
-            query = "SELECT {} FROM {} WHERE {} = '{}' AND {} = '{}'".format(
-                    'column_name, column_type, column_default',
-                    'information_schema.columns',
-                    'table_schema', tableSchema,
-                    'table_name', tableName)
-
-            resultSet = dbConn.getConnection().execute(text(query))
-            self.columnNames = resultSet.fetchall()   # list of tuples
+                # One query fetches every table of the schema, this one included
+                self.columnNames = self.parent.bulkLoadTables(connection).get(self.tableName, [])
 
+        self.columnIndex.update([c[0] for c in self.columnNames])
         return ReturnCode.SUCCESS
 
-    def setup(self):
-        filename = "{}/{}/{}.columns".format(env.MINI_CACHE,
-                                                        self.parent.dbName,
-                                                        self.tableName)
-        self.loadColumnNames(filename)
+    def setup(self, connection=None, columns=None):
+        if columns is None:
+            filename = "{}/{}/{}.columns".format(env.MINI_CACHE,
+                                                            self.parent.dbName,
+                                                            self.tableName)
+            self.loadColumnNames(filename, connection=connection)
+        else:
+            self.columnNames = columns
+            self.columnIndex.update([c[0] for c in self.columnNames])
 
-        #TODO: Consider pre-loading all table configs at once
         configFile = "{}/{}.cfg".format(env.MINI_CONFIG, self.parent.dbName)
         if not self.loadConfigForTable(configFile, self.tableName):
             return em.returnCode
+        self.rules = ValidationRules.fromConfig(self.config)
 
         return ReturnCode.SUCCESS
 
@@ -308,146 +632,132 @@ class TableConfig:
 
     # Load table-specific configuration settings
     def loadConfigForTable(self, configFile, tableName):
-        sectionHeader = '['+tableName+']'
-        nextSectionRE = re.compile(re.escape('['))
-        isInsideSection = False
         regexMode = False
         regexCount = 0
 
-        try:
-            with open(configFile, 'r') as configFp:
-                for line in configFp:
-
-                    # Skip lines coming before the section of interest
-                    if not isInsideSection:
-                        if line.lstrip().startswith(sectionHeader):
-                            isInsideSection = True
-                        continue
-
-                    # Stop when the next section begins
-                    line = line.strip()
-                    if re.match(nextSectionRE, line):
-                        break
+        # The config file is parsed once into sections, so this is a lookup
+        configIndex = ConfigFileIndex.get(configFile)
+        sections = configIndex.sections()
+        if sections is None:
+            if not configIndex.missingReported:
+                configIndex.missingReported = True
+                print('Database config file "{}" not found. Using system defaults.'.format(configFile))
+        else:
+            for line in sections.get(tableName, []):
+                # Require the lines to have format "attributeName=value"
+                attribute, equalsSign, value = line.partition('=')
+                if not equalsSign:
+                    continue
 
-                    # Skip comments
-                    elif line.startswith('#'):
-                        continue
-
-                    # Require the lines to have format "attributeName=value"
-                    attribute, equalsSign, value = line.partition('=')
-                    if not equalsSign:
-                        continue
-
-                    # Branch on the attribute. First handle the attribute names that
-                    # pre-empt the regex state machine, namely, the "default..."
-                    # and "regex" attributes
-                    defaultAttr = re.match(r'default([A-Z].*)', attribute)
-                    if defaultAttr:
-                        regexMode = True
-
-                        # Set the canonical regex and its type
-                        regexType_0 = defaultAttr.group(1)
-                        if regexType_0 == 'Int':
-                            regex = r'^[-]?[:digit:]+$'
-                            regexType = RegexType.DEFAULT_INT
-                        elif regexType_0 == 'Alpha':
-                            regex = r'^[[:alnum:]_\ .]+$'
-                            regexType = RegexType.DEFAULT_ALPHA
-                        elif regexType_0 == 'Float':
-                            regex = r'^[-]?[:digit:]*\.[:digit:]+$'
-                            regexType = RegexType.DEFAULT_FLOAT
-                        elif regexType_0 == 'Date':
-                            regex = r'^[0-9]{4}[/-][0-9]{1,2}[/-][0-9]{1,2}$'
-                            regexType = RegexType.DEFAULT_DATE
-                        sCount = str(regexCount)
-                        self.config['regex' + sCount] = regex
-                        self.config['regexType' + sCount] = regexType  #.value
-                        # Increment the counter now because there might not be
-                        # any further attributes for this regex. If there are,
-                        # they will compensate for this pre-incrementation.
-                        regexCount += 1
-
-                    elif attribute == 'regex':
-                        regexMode = True
-                        regex = value
-                        regexType = RegexType.NORMAL
-                        sCount = str(regexCount)
-                        self.config['regex' + sCount] = regex
-                        self.config['regexType' + sCount] = regexType
-                        # Do not increment the counter. The REQUIRED attribute
-                        # "column" will do it.
-                        # regexCount += 1
-
-                    # The state machine for regexes. Different types of regex
-                    # require or accept different special key-value specifiers.
-                    elif regexMode:
-                        if regexType == RegexType.DEFAULT_ALPHA:
-                            # Optional specifier: length
-                            if attribute == 'length':
-                                regexCount -= 1   # roll the counter back - see "Increment the counter" above 
-                                # Length limit(s) can be a range, a half-empty range or a solitary number
-                                rangeMatch = re.match('([0-9]*)([^0-9])?([0-9]*)$', value)
+                # Branch on the attribute. First handle the attribute names that
+                # pre-empt the regex state machine, namely, the "default..."
+                # and "regex" attributes
+                defaultAttr = re.match(r'default([A-Z].*)', attribute)
+                if defaultAttr:
+                    regexMode = True
+
+                    # Set the canonical regex and its type
+                    regexType_0 = defaultAttr.group(1)
+                    # (These are compiled with Python's re, which lacks POSIX classes.)
+                    if regexType_0 == 'Int':
+                        regex = r'^[-]?[0-9]+$'
+                        regexType = RegexType.DEFAULT_INT
+                    elif regexType_0 == 'Alpha':
+                        regex = r'^[A-Za-z0-9_\ .]+$'
+                        regexType = RegexType.DEFAULT_ALPHA
+                    elif regexType_0 == 'Float':
+                        regex = r'^[-]?[0-9]*\.[0-9]+$'
+                        regexType = RegexType.DEFAULT_FLOAT
+                    elif regexType_0 == 'Date':
+                        regex = r'^[0-9]{4}[/-][0-9]{1,2}[/-][0-9]{1,2}$'
+                        regexType = RegexType.DEFAULT_DATE
+                    sCount = str(regexCount)
+                    self.config['regex' + sCount] = regex
+                    self.config['regexType' + sCount] = regexType  #.value
+                    self.config['column' + sCount] = value
+                    # Increment the counter now because there might not be
+                    # any further attributes for this regex. If there are,
+                    # they will compensate for this pre-incrementation.
+                    regexCount += 1
+
+                elif attribute == 'regex':
+                    regexMode = True
+                    regex = value
+                    regexType = RegexType.NORMAL
+                    sCount = str(regexCount)
+                    self.config['regex' + sCount] = regex
+                    self.config['regexType' + sCount] = regexType
+                    # Do not increment the counter. The REQUIRED attribute
+                    # "column" will do it.
+                    # regexCount += 1
+
+                # The state machine for regexes. Different types of regex
+                # require or accept different special key-value specifiers.
+                elif regexMode:
+                    if regexType == RegexType.DEFAULT_ALPHA:
+                        # Optional specifier: length
+                        if attribute == 'length':
+                            regexCount -= 1   # roll the counter back - see "Increment the counter" above 
+                            # Length limit(s) can be a range, a half-empty range or a solitary number
+                            rangeMatch = re.match('([0-9]*)([^0-9])?([0-9]*)$', value)
+                            sCount = str(regexCount)
+                            self.config['lowerBounds' + sCount] = rangeMatch.group(1)
+                            if rangeMatch.group(3):   # 5-10 or -10
+                                self.config['upperBounds' + sCount] = rangeMatch.group(3)
+                            elif rangeMatch.group(2):   # 5-
+                                self.config['upperBounds' + sCount] = '99999'
+                            else:    # a solitary number
+                                self.config['upperBounds' + sCount] = rangeMatch.group(3)
+                            regexCount += 1
+                            regexMode = False
+                        else:
+                            # Any other specifier signals that we are no longer in regex mode.
+                            # Handle the specifier generically.
+                            regexMode = self._acceptGenericConfig(attribute, value)
+
+                    elif regexType == RegexType.NORMAL:
+                        # Required specifier: column; no other specifiers are allowed
+                        if attribute == 'column':
+                            # Store the column, terminate regex mode and accept the regex
+                            sCount = str(regexCount)
+                            self.config['column' + sCount] = value
+                            # Look up the column type in the global column
+                            # list and store it. In the column list, accept
+                            # a populated or an unpopulated table name column
+                            column = [item for item in
+                                self.columnNames if item[0] == value]
+                            if column and len(column) == 1:
+                                columnType = sqlTypeToInternalType(column[0][1])
                                 sCount = str(regexCount)
-                                self.config['lowerBounds' + sCount] = rangeMatch.group(1)
-                                if rangeMatch.group(3):   # 5-10 or -10
-                                    self.config['upperBounds' + sCount] = rangeMatch.group(3)
-                                elif rangeMatch.group(2):   # 5-
-                                    self.config['upperBounds' + sCount] = '99999'
-                                else:    # a solitary number
-                                    self.config['upperBounds' + sCount] = rangeMatch.group(3)
+                                self.config['columnType' + sCount] = columnType
                                 regexCount += 1
                                 regexMode = False
-                            else:
-                                # Any other specifier signals that we are no longer in regex mode.
-                                # Handle the specifier generically.
-                                regexMode = self._acceptGenericConfig(attribute, value)
-
-                        elif regexType == RegexType.NORMAL:
-                            # Required specifier: column; no other specifiers are allowed
-                            if attribute == 'column':
-                                # Store the column, terminate regex mode and accept the regex
-                                sCount = str(regexCount)
-                                self.config['column' + sCount] = value
-                                # Look up the column type in the global column
-                                # list and store it. In the column list, accept
-                                # a populated or an unpopulated table name column
-                                column = [item for item in
-                                    self.columnNames if item[0] == value]
-                                if column and len(column) == 1:
-                                    columnType = sqlTypeToInternalType(column[0][1])
-                                    sCount = str(regexCount)
-                                    self.config['columnType' + sCount] = columnType
-                                    regexCount += 1
-                                    regexMode = False
-                                else:
-                                    regexMode = False
-                                    return em.setError(ReturnCode.ILL_FORMED_CONFIG_FILE)
                             else:
                                 regexMode = False
                                 return em.setError(ReturnCode.ILL_FORMED_CONFIG_FILE)
-
-                        else:   # DEFAULT_INT, _FLOAT or _DATE
-                            if attribute == 'range':
-                                regexCount -= 1
-                                # Store the numeric or calendar limits
-                                if regexType == RegexType.DEFAULT_INT:
-                                    match = re.match('([-]?[0-9]+)-([-]?[0-9]+)$', value)
-                                elif RegexType == RegexType.DEFAULT_FLOAT:
-                                    match = re.match('([0-9.]+)-([0-9.]+)$', value)
-                                else:    # DEFAULT_DATE
-                                    match = re.match('([0-9]{4}/[0-9]{1,2}/[0-9]{1,2})-([0-9]{4}/[0-9]{1,2}/[0-9]{1,2})$', value)
-                                sCount = str(regexCount)
-                                self.config['lowerBounds' + sCount] = match.group(1)
-                                self.config['upperBounds' + sCount] = match.group(2)
-                                regexCount += 1
-                                regexMode = False
-
-                    # Not in regex mode.
-                    else:
-                        regexMode = self._acceptGenericConfig(attribute, value)
-
-        except FileNotFoundError:
-            print('Database config file "{}" not found. Using system defaults.'.format(configFile))
+                        else:
+                            regexMode = False
+                            return em.setError(ReturnCode.ILL_FORMED_CONFIG_FILE)
+
+                    else:   # DEFAULT_INT, _FLOAT or _DATE
+                        if attribute == 'range':
+                            regexCount -= 1
+                            # Store the numeric or calendar limits
+                            if regexType == RegexType.DEFAULT_INT:
+                                match = re.match('([-]?[0-9]+)-([-]?[0-9]+)$', value)
+                            elif regexType == RegexType.DEFAULT_FLOAT:
+                                match = re.match('([0-9.]+)-([0-9.]+)$', value)
+                            else:    # DEFAULT_DATE
+                                match = re.match('([0-9]{4}/[0-9]{1,2}/[0-9]{1,2})-([0-9]{4}/[0-9]{1,2}/[0-9]{1,2})$', value)
+                            sCount = str(regexCount)
+                            self.config['lowerBounds' + sCount] = match.group(1)
+                            self.config['upperBounds' + sCount] = match.group(2)
+                            regexCount += 1
+                            regexMode = False
+
+                # Not in regex mode.
+                else:
+                    regexMode = self._acceptGenericConfig(attribute, value)
 
         if self.tableName:
             self.config['regexCount'] = regexCount
@@ -1,17 +1,31 @@
+import re
 import sys
+import threading
 import miniEnv as env
 from appSettings import miniSettings, fakePass; ms = miniSettings
 from errorManager import miniErrorManager, ReturnCode; em = miniErrorManager
 from sqlalchemy import create_engine
-from prompt_toolkit import prompt
-from prompt_toolkit.formatted_text import FormattedText
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.sql import text
 
 # Database connection class. Should be used like a singleton.
 class databaseConnection():
+
+    # Dialects whose servers host several databases reachable through "USE".
+    # For these, one engine (and its connection pool) serves every database
+    # on the server, so a database switch needs no new engine or handshake.
+    USE_SWITCHABLE_DIALECTS = ['mysql', 'mariadb']
+
+    # Engines are kept for the life of the program, one per server
+    _engines = {}
+
     def __init__(self):
         self._cxn = None
+        self._engine = None
         self._gotPassword = False
         self._dialect = None
+        # A connection of the current thread's own, used in place of the shared one
+        self._threadLocal = threading.local()
 
     def __del__(self):
         if self._cxn:
@@ -23,33 +37,112 @@ class databaseConnection():
             self._dialect = None
             m = re.match('(.*?)[+:]', dialectNameOrStr)
             if m:
-                self._dialect = m.groups(0)
+                self._dialect = m.group(1)
         else:
             self._dialect = dialectNameOrStr
 
     def getDialect(self):
         return self._dialect
 
+    def _getEngine(self, url):
+        '''
+        Look up the engine for the server named in the URL, creating it
+        (and its pool) on first use
+        '''
+        isSwitchable = url.get_backend_name() in self.USE_SWITCHABLE_DIALECTS
+        serverKey = (url.drivername, url.username, url.password, url.host, url.port,
+                     tuple(sorted(url.query.items())),
+                     None if isSwitchable else url.database)
+        engine = self._engines.get(serverKey)
+        if not engine:
+            pool = ms.connection['Pool']
+            try:
+                engine = create_engine(url,
+                        pool_size=pool.as_int('poolSize'),
+                        max_overflow=pool.as_int('maxOverflow'),
+                        pool_pre_ping=pool.as_bool('prePing'),
+                        pool_recycle=pool.as_int('recycle'))
+            except TypeError:
+                # Some dialects (e.g. sqlite) use pool classes that take no sizing
+                engine = create_engine(url, pool_pre_ping=pool.as_bool('prePing'))
+            self._engines[serverKey] = engine
+        return engine
+
     def _tryToConnect(self, connectionString):
         try:
-            engine = create_engine(connectionString)
-            self._cxn = engine.connect()
+            url = make_url(connectionString)
+            self._engine = self._getEngine(url)
+            self._cxn = self._engine.connect()
+
+            # A pooled connection may have been left pointing at any DB on
+            # the server, so make sure it is pointing at the one we want
+            if url.database and url.get_backend_name() in self.USE_SWITCHABLE_DIALECTS:
+                self._useDatabase(self._cxn, url.database)
         except Exception as e:
+            if self._cxn:
+                self._cxn.close()
+                self._cxn = None
             em.setError(ReturnCode.DATABASE_CONNECTION_ERROR,
                          type(e).__name__, e.args)
             return None
         return self._cxn
 
+    @staticmethod
+    def _useDatabase(connection, dbName):
+        ''' Point a connection of a USE-switchable server at the given DB '''
+        # Inside backticks a backtick is written doubled. A colon is escaped
+        # so that text() does not take what follows for a bind parameter.
+        quotedName = '`' + dbName.replace('`', '``') + '`'
+        connection.execute(text('USE ' + quotedName.replace(':', '\\:')))
+
     def changeDatabase(self, dbName):
         '''
-        Close the current DB connection and open a new one to the given DB
+        Return the current connection to its pool and borrow one for the given DB.
+        The server's engine is reused, so this costs a "USE" rather than a new
+        engine and handshake.
         '''
         if self._cxn:
-            del self._cxn
+            self._cxn.close()
             self._cxn = None
         return self.getConnection()
 
+    def newConnection(self, dbName=None):
+        '''
+        Borrow a connection of its own from the current engine's pool, for
+        work done off the main thread. Without a dbName, the connection is to
+        the database of the shared connection. Returns None when no engine has
+        been set up yet or when the engine cannot reach the given database.
+        '''
+        engine = self._engine
+        if not engine:
+            return None
+        isSwitchable = engine.url.get_backend_name() in self.USE_SWITCHABLE_DIALECTS
+        if dbName is None:
+            dbName = ms.settings['database'] if isSwitchable else engine.url.database
+        if not isSwitchable and engine.url.database != dbName:
+            return None
+        connection = engine.connect()
+        if isSwitchable:
+            try:
+                self._useDatabase(connection, dbName)
+            except Exception:
+                # E.g. no such database: give the connection back before reporting
+                connection.close()
+                raise
+        return connection
+
+    def setThreadConnection(self, connection):
+        '''
+        Have getConnection() return the given connection, e.g. one borrowed by
+        newConnection(), when called from the current thread. None restores
+        the shared connection.
+        '''
+        self._threadLocal.cxn = connection
+
     def getConnection(self):
+        threadCxn = getattr(self._threadLocal, 'cxn', None)
+        if threadCxn:
+            return threadCxn
         if self._cxn:
             return self._cxn
         
@@ -93,6 +186,8 @@ class databaseConnection():
             if not cxnSettings[defType]['MINI_PASSWORD'] and not self._gotPassword:
                 # In a tty (screen-interactive) situation, ask for a password
                 if ms.isOutputTty:
+                    from prompt_toolkit import prompt
+                    from prompt_toolkit.formatted_text import FormattedText
                     msg ='Please enter password for user "{}": '.format(
                             cxnSettings[defType]['MINI_USER'])
                     cxnSettings[defType]['MINI_PASSWORD'] = prompt(
@@ -1,9 +1,7 @@
 import sys
 import platform
+import threading
 from enum import Enum
-from prompt_toolkit import print_formatted_text
-from prompt_toolkit.formatted_text import FormattedText
-from prompt_toolkit.styles import Style
 
 class ReturnCode(Enum):
     SUCCESS = 0
@@ -30,6 +28,8 @@ class ReturnCode(Enum):
     TABLE_NOT_FOUND = 21
     FILE_NOT_WRITABLE = 22
     INCONSISTENT_QUERY_TYPES =23
+    MISSING_MODULE = 24
+    INCONSISTENT_COLUMN_TYPE = 25
 
 errorMsgDict = {
     0 : '',
@@ -56,9 +56,15 @@ errorMsgDict = {
     21 : 'Table "{0}" not found.',
     # 22 : 'File "{0}" is not writable.',
     23 : 'Terms/symbols "{0}" and "{1}" indicate inconsistent query types.',
+    24 : 'The "{0}" format requires the Python package "{1}".',
+    25 : 'Column "{0}" holds {1} values after {2} ones; the "{3}" output stops there. Try -csv or -ndjson.',
     }
 
-class ErrorManager:
+class ErrorManager(threading.local):
+    '''
+    Holds the error state of the current command. The state is per thread,
+    so that work done in the background cannot disturb the foreground.
+    '''
 
     def __init__(self):
         self._errMsg = ''
@@ -114,12 +120,18 @@ class ErrorManager:
     def getError(self):
         return self._returnCode
 
+    def setOutputStream(self, stream):
+        ''' Send the current thread's messages to stream, e.g. to buffer them '''
+        self._errOutputStream = stream
+
     def doExit(self, msg=None):
         if self._errOutputStream.isatty() and self._returnCode.value:
             if self._returnCode == ReturnCode.USER_EXIT:
                 color = 'green' if platform.system() == 'Windows' else 'lightgreen'
             else:
                 color = 'red'
+            from prompt_toolkit import print_formatted_text
+            from prompt_toolkit.formatted_text import FormattedText
             print_formatted_text(FormattedText([(color, msg or self._errMsg)]),
                                 file=self._errOutputStream)
         else:
@@ -132,6 +144,8 @@ class ErrorManager:
     def doWarn(self, msg=None):
         if self._errOutputStream.isatty() and self._returnCode.value:
             color = 'yellow' if self._returnCode == ReturnCode.Clarification else 'red'
+            from prompt_toolkit import print_formatted_text
+            from prompt_toolkit.formatted_text import FormattedText
             print_formatted_text(FormattedText([(color, msg or self._errMsg)]),
                                 file=self._errOutputStream)
         else:
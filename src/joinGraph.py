@@ -0,0 +1,147 @@
+import os
+import threading
+from array import array
+
+from schemaCache import TEXT_FOREIGN_KEY_FILE
+
+class JoinGraph:
+    '''
+    The tables of a database linked by their foreign keys, as read from the
+    cache file information_schema.key_column_usage, for finding join paths.
+
+    Tables are numbered and the graph is held as adjacency lists of table
+    numbers, with the joining column pairs of each linked pair of tables in a
+    side dictionary. The links are followed in both directions, since a join
+    works either way. The shortest paths from a table to all others are
+    found by one breadth-first search, whose tree (an array of parent numbers)
+    is kept, so each later path is read off in time proportional to its
+    length. A tree is computed the first time its table is asked about:
+    precomputing every pair would take memory quadratic in the table count.
+
+    One graph is kept per cache file and rebuilt only when the file's
+    modification time changes, e.g. after a schema refresh.
+    '''
+
+    _graphs = {}
+
+    @classmethod
+    def get(cls, dbCacheDir):
+        fileName = os.path.join(dbCacheDir, TEXT_FOREIGN_KEY_FILE)
+        try:
+            mtime = os.path.getmtime(fileName)
+        except OSError:
+            mtime = None
+        graph = cls._graphs.get(fileName)
+        if graph is None or graph._mtime != mtime:
+            graph = JoinGraph(cls._readEdges(fileName) if mtime is not None else ())
+            graph._mtime = mtime
+            cls._graphs[fileName] = graph
+        return graph
+
+    @staticmethod
+    def _readEdges(fileName):
+        edges = []
+        try:
+            with open(fileName, 'r') as fkFp:
+                for line in fkFp:
+                    edge = line.split()
+                    if len(edge) == 4:
+                        edges.append(tuple(edge))
+        except OSError:
+            pass
+        return edges
+
+    def __init__(self, foreignKeys=()):
+        '''
+        :param foreignKeys: iterable of (table, column, referencedTable, referencedColumn)
+        '''
+        self._mtime = None
+        self._tableNames = []       # table number -> name
+        self._tableNumbers = {}     # name -> table number
+        self._adjacency = []        # table number -> list of linked table numbers
+        self._joinColumns = {}      # (table number, table number) -> list of column pairs
+        self._trees = {}            # table number -> array of BFS parents, -1 if unreachable
+        self._treesLock = threading.Lock()
+        for (table, column, referencedTable, referencedColumn) in foreignKeys:
+            if table == referencedTable:
+                # Self-references (e.g. employees.manager_id) lead nowhere new
+                continue
+            a = self._number(table)
+            b = self._number(referencedTable)
+            if (a, b) not in self._joinColumns:
+                self._adjacency[a].append(b)
+                self._adjacency[b].append(a)
+                self._joinColumns[(a, b)] = []
+                self._joinColumns[(b, a)] = []
+            self._joinColumns[(a, b)].append((column, referencedColumn))
+            self._joinColumns[(b, a)].append((referencedColumn, column))
+
+    def __len__(self):
+        return len(self._tableNames)
+
+    def __contains__(self, tableName):
+        return tableName in self._tableNumbers
+
+    def _number(self, tableName):
+        number = self._tableNumbers.get(tableName)
+        if number is None:
+            number = self._tableNumbers[tableName] = len(self._tableNames)
+            self._tableNames.append(tableName)
+            self._adjacency.append([])
+        return number
+
+    def neighbors(self, tableName):
+        ''' Names of the tables linked to a table by a foreign key either way '''
+        number = self._tableNumbers.get(tableName)
+        if number is None:
+            return []
+        return [self._tableNames[n] for n in self._adjacency[number]]
+
+    def _tree(self, source):
+        tree = self._trees.get(source)
+        if tree is None:
+            tree = array('i', [-1]) * len(self._tableNames)
+            tree[source] = source
+            frontier = [source]
+            while frontier:
+                nextFrontier = []
+                for node in frontier:
+                    for neighbor in self._adjacency[node]:
+                        if tree[neighbor] < 0:
+                            tree[neighbor] = node
+                            nextFrontier.append(neighbor)
+                frontier = nextFrontier
+            with self._treesLock:
+                tree = self._trees.setdefault(source, tree)
+        return tree
+
+    def joinPath(self, fromTable, toTable):
+        '''
+        The shortest chain of joins leading from one table to another, as a
+        list of (table, joinedTable, columnPairs) steps, where columnPairs
+        lists the (column, joinedColumn) pairs that link the two. The cache
+        does not record constraint names, so several pairs may be one
+        composite key or alternative keys. Returns [] for a table to itself
+        and None when there is no path.
+        '''
+        source = self._tableNumbers.get(fromTable)
+        target = self._tableNumbers.get(toTable)
+        if source is None or target is None:
+            return [] if fromTable == toTable else None
+        tree = self._tree(source)
+        if tree[target] < 0:
+            return None
+        steps = []
+        node = target
+        while node != source:
+            parent = tree[node]
+            steps.append((self._tableNames[parent], self._tableNames[node],
+                            self._joinColumns[(parent, node)]))
+            node = parent
+        steps.reverse()
+        return steps
+
+    def distance(self, fromTable, toTable):
+        ''' Number of joins between two tables, or None if they are not connected '''
+        path = self.joinPath(fromTable, toTable)
+        return None if path is None else len(path)
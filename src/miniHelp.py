@@ -18,6 +18,8 @@ def giveMiniHelp():
     print('    -e  Process a single query and exit')
     print('    -q  Show the generated SQL query')
     print('    -r  Run the query')
+    print('    --batch  With redirected input, commit DML statements in batches')
+    print('    --force  With redirected input, continue past failed statements')
     print('\n')
     print('table: main table name for query.')
 
@@ -0,0 +1,194 @@
+import re
+
+class SubsequenceIndex:
+    '''
+    Index of names (tables, columns) for subsequence-style completion, where
+    "abc" matches any name containing a, b and c in that order.
+
+    Every name occupies a slot. For each (case-folded) character we keep a
+    bitmap, stored as a Python int, of the slots whose names contain that
+    character. ANDing the bitmaps of a query's characters leaves only the
+    names containing all of them, so the exact order check -- regex or
+    otherwise -- runs on a handful of survivors instead of on every name.
+    The candidates are a superset of the true matches, which lets completers
+    with fancier matching rules (camel/snake case, abbreviations) still use
+    the index as a prefilter.
+    '''
+
+    def __init__(self, names=()):
+        self._names = []        # slot -> name, None for a freed slot
+        self._slots = {}        # name -> slot
+        self._freeSlots = []
+        self._bitmaps = {}      # folded character -> bitmap of slots
+        self._allSlots = 0
+        for name in names:
+            self.add(name)
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, name):
+        return name in self._slots
+
+    def add(self, name):
+        if name in self._slots:
+            return
+        if self._freeSlots:
+            slot = self._freeSlots.pop()
+            self._names[slot] = name
+        else:
+            slot = len(self._names)
+            self._names.append(name)
+        self._slots[name] = slot
+        bit = 1 << slot
+        self._allSlots |= bit
+        for c in set(name.lower()):
+            self._bitmaps[c] = self._bitmaps.get(c, 0) | bit
+
+    def remove(self, name):
+        slot = self._slots.pop(name, None)
+        if slot is None:
+            return
+        mask = ~(1 << slot)
+        self._allSlots &= mask
+        for c in set(name.lower()):
+            self._bitmaps[c] &= mask
+        self._names[slot] = None
+        self._freeSlots.append(slot)
+
+    def update(self, names):
+        '''
+        Incrementally bring the index in line with a new list of names,
+        touching only the names that were added or dropped
+        '''
+        newNames = set(names)
+        for name in [n for n in self._slots if n not in newNames]:
+            self.remove(name)
+        for name in names:
+            self.add(name)
+
+    def candidates(self, query):
+        '''
+        Names that contain every word character of the query, in any order and
+        regardless of case. Punctuation in the query is ignored here.
+        '''
+        bitmap = self._allSlots
+        for c in set(query.lower()):
+            if c.isalnum() or c == '_':
+                bitmap &= self._bitmaps.get(c, 0)
+                if not bitmap:
+                    return []
+        names = []
+        while bitmap:
+            lowBit = bitmap & -bitmap
+            names.append(self._names[lowBit.bit_length() - 1])
+            bitmap ^= lowBit
+        return names
+
+    def matches(self, query, anchored=False, ignoreCase=False):
+        ''' Names having the query as a subsequence, optionally from the first character '''
+        return [name for name in self.candidates(query)
+                    if isSubsequence(query, name, anchored, ignoreCase)]
+
+
+def isSubsequence(query, name, anchored=False, ignoreCase=False):
+    '''
+    True when the characters of query occur in name in order, as the regex
+    'a.*?b.*?c' would find them. With anchored, the first characters must coincide.
+    '''
+    if ignoreCase:
+        query = query.lower()
+        name = name.lower()
+    if not query:
+        return True
+    if anchored and not name.startswith(query[0]):
+        return False
+    position = 0
+    for c in query:
+        position = name.find(c, position)
+        if position < 0:
+            return False
+        position += 1
+    return True
+
+
+# The words of a camelCase or snake_case name: "customerID", "CustomerId" and
+# "customer_id" all come out as customer, id
+NAME_TOKEN_RE = re.compile(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+')
+
+def nameTokens(name):
+    return [token.lower() for token in NAME_TOKEN_RE.findall(name)]
+
+class ColumnIndex:
+    '''
+    Inverted index of the columns of all the tables of a database, answering
+    "which tables have a customer_id" with one dictionary lookup instead of a
+    search through every table.
+
+    Columns are filed under their normalized name, the snake_case spelling
+    of their words, so customerId finds customer_id too. Each word is in turn
+    mapped to the column names containing it, for completion on part of a
+    name. A table's columns can be replaced or removed on their own, touching
+    only that table's entries.
+    '''
+
+    def __init__(self):
+        self._columnsByTable = {}   # table -> list of (column, type) as indexed
+        self._byName = {}           # normalized column name -> {table: [(column, type), ...]}
+        self._byToken = {}          # word -> {column: number of tables having it}
+
+    def __len__(self):
+        return len(self._columnsByTable)
+
+    def __contains__(self, tableName):
+        return tableName in self._columnsByTable
+
+    @staticmethod
+    def normalize(columnName):
+        return '_'.join(nameTokens(columnName)) or columnName.lower()
+
+    def setTable(self, tableName, columns):
+        '''
+        Index a table's columns, given as (name, type, ...) tuples, replacing
+        what was indexed for it before
+        '''
+        self.removeTable(tableName)
+        indexed = self._columnsByTable[tableName] = [(c[0], c[1] if len(c) > 1 else '') for c in columns]
+        for (columnName, columnType) in indexed:
+            # A table may spell one name several ways (customerId, customer_id)
+            tables = self._byName.setdefault(self.normalize(columnName), {})
+            tables.setdefault(tableName, []).append((columnName, columnType))
+            for token in set(nameTokens(columnName)):
+                counts = self._byToken.setdefault(token, {})
+                counts[columnName] = counts.get(columnName, 0) + 1
+
+    def removeTable(self, tableName):
+        for (columnName, columnType) in self._columnsByTable.pop(tableName, ()):
+            key = self.normalize(columnName)
+            tables = self._byName[key]
+            columns = tables[tableName]
+            columns.remove((columnName, columnType))
+            if not columns:
+                del tables[tableName]
+                if not tables:
+                    del self._byName[key]
+            for token in set(nameTokens(columnName)):
+                counts = self._byToken[token]
+                counts[columnName] -= 1
+                if not counts[columnName]:
+                    del counts[columnName]
+                    if not counts:
+                        del self._byToken[token]
+
+    def tablesWithColumn(self, columnName):
+        '''
+        List of (table, type) pairs of the tables having the column, in any
+        spelling. A table with several spellings of it is listed once per spelling.
+        '''
+        tables = self._byName.get(self.normalize(columnName))
+        return [(tableName, column[1]) for (tableName, columns) in list(tables.items())
+                    for column in columns] if tables else []
+
+    def columnsWithToken(self, token):
+        ''' Names of the columns, in any table, having the word among theirs '''
+        return list(self._byToken.get(token.lower(), ()))
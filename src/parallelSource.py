@@ -0,0 +1,170 @@
+import io
+import re
+import sys
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from appSettings import miniSettings; ms = miniSettings
+from databaseConnection import miniDbConnection; dbConn = miniDbConnection
+from errorManager import miniErrorManager, ReturnCode; em = miniErrorManager
+from queryProcessor import QueryProcessor
+from miniUtils import QueryType
+
+# Literal SQL that only reads, and so may run alongside other reads
+SOURCE_READ_ONLY_SQL_RE = re.compile(r'\s*(?:select|show|desc|describe|explain)\b', re.I)
+SOURCE_WRITING_SQL_RE = re.compile(r'\binto\b|\bfor\s+update\b|\block\s+in\s+share\s+mode\b', re.I)
+
+class _threadRoutedStream:
+    '''
+    Stands in for sys.stdout while statements run in parallel. What a worker
+    thread prints goes to a buffer of its own; every other thread prints to
+    the real stream. The buffer is a text layer over bytes, like the real
+    stdout, so the writers that bypass the text layer keep their place among
+    the printed lines.
+    '''
+    def __init__(self, stream):
+        self.stream = stream
+        self._local = threading.local()
+
+    def capture(self):
+        self._local.buffer = io.TextIOWrapper(io.BytesIO(),
+                    encoding=getattr(self.stream, 'encoding', None) or 'utf-8',
+                    errors=getattr(self.stream, 'errors', None) or 'strict',
+                    write_through=True)
+        return self._local.buffer
+
+    def release(self):
+        ''' Stop capturing the current thread's output, and return it as bytes '''
+        buffer = self._local.buffer
+        self._local.buffer = None
+        buffer.flush()
+        return buffer.buffer.getvalue()
+
+    def __getattr__(self, name):
+        return getattr(getattr(self._local, 'buffer', None) or self.stream, name)
+
+class ParallelSource:
+    '''
+    Runs the read-only statements of a sourced file on a pool of threads,
+    each with a connection of its own borrowed from the engine's pool.
+
+    The output of each statement is buffered and written out in the order
+    of the statements in the file, as soon as every statement before it has
+    been written. A command that is not submitted (anything that may change
+    data, the schema or the program state: DML, DDL, db, table, setv ...) is
+    a barrier. The caller drains the pending statements with drain() and then
+    runs the command itself, as a sequential source would.
+    '''
+
+    # Statements run ahead of the one being waited on, per thread
+    LOOKAHEAD = 4
+
+    def __init__(self, threadCount):
+        self._threadCount = threadCount
+        self._executor = ThreadPoolExecutor(max_workers=threadCount, thread_name_prefix='source')
+        self._pending = deque()
+        self._stdout = None
+
+    @staticmethod
+    def readOnlySql(args):
+        '''
+        The literal SQL to run for a classified command that only reads, ''
+        for a TQL query deduced to be a SELECT, or None for any command that
+        may change something
+        '''
+        if args._isQueryCommand:
+            queryType = QueryProcessor(args).deduceQueryType()
+            if em.getError() != ReturnCode.SUCCESS:
+                # Left for the sequential run to report
+                em.resetError()
+                return None
+            return '' if queryType == QueryType.SELECT else None
+        if args._commandName == 'sq':
+            # Run as the sq command would run it, without its options
+            literalSql = args._literalSql or ''
+            if SOURCE_READ_ONLY_SQL_RE.match(literalSql) and not SOURCE_WRITING_SQL_RE.search(literalSql):
+                return literalSql
+        return None
+
+    def __enter__(self):
+        self._stdout = sys.stdout = _threadRoutedStream(sys.stdout)
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        # After an error, or an exception, the rest is not waited for
+        for future in self._pending:
+            future.cancel()
+        self._executor.shutdown(wait=True)
+        self._pending.clear()
+        sys.stdout = self._stdout.stream
+        return False
+
+    def submit(self, args, literalSql=''):
+        '''
+        Queue a read-only command for execution. Returns the code of the first
+        failed statement written out meanwhile, or SUCCESS.
+        '''
+        self._pending.append(self._executor.submit(self._run, args, literalSql))
+        if len(self._pending) > self._threadCount * self.LOOKAHEAD:
+            return self._emit(self._pending.popleft())
+        while self._pending and self._pending[0].done():
+            retValue = self._emit(self._pending.popleft())
+            if retValue != ReturnCode.SUCCESS:
+                return retValue
+        return ReturnCode.SUCCESS
+
+    def drain(self):
+        ''' Wait for the queued commands and write out their output, in order '''
+        while self._pending:
+            retValue = self._emit(self._pending.popleft())
+            if retValue != ReturnCode.SUCCESS:
+                return retValue
+        return ReturnCode.SUCCESS
+
+    def _emit(self, future):
+        output, errors, retValue = future.result()
+        stream = self._stdout.stream
+        stream.flush()
+        if hasattr(stream, 'buffer'):
+            stream.buffer.write(output)
+            stream.buffer.flush()
+        else:
+            stream.write(output.decode(stream.encoding or 'utf-8', 'replace'))
+        if errors:
+            sys.stderr.write(errors)
+            sys.stderr.flush()
+        return retValue
+
+    def _run(self, args, literalSql):
+        errors = io.StringIO()
+        em.setOutputStream(errors)
+        self._stdout.capture()
+        try:
+            # Each statement borrows a connection from the pool and returns
+            # it when done, in the thread it was borrowed in
+            connection = None
+            try:
+                connection = dbConn.newConnection()
+            except Exception as e:
+                em.setError(ReturnCode.DATABASE_CONNECTION_ERROR, type(e).__name__, e.args)
+            if connection is None:
+                if em.getError() == ReturnCode.SUCCESS:
+                    em.setError(ReturnCode.DATABASE_CONNECTION_ERROR, 'no pooled connection',
+                                ms.settings['database'])
+                retValue = em.getError()
+            else:
+                dbConn.setThreadConnection(connection)
+                try:
+                    retValue = QueryProcessor(args).process(literalSql)
+                finally:
+                    dbConn.setThreadConnection(None)
+                    connection.close()
+            if retValue != ReturnCode.SUCCESS:
+                em.doWarn()
+                # As in a sequential run, a failed sq is reported but is no reason to stop
+                if literalSql:
+                    retValue = ReturnCode.SUCCESS
+        finally:
+            output = self._stdout.release()
+        return output, errors.getvalue(), retValue
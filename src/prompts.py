@@ -1,5 +1,4 @@
 import re
-from prompt_toolkit.styles import Style
 
 from appSettings import miniSettings; ms = miniSettings
 
@@ -3,11 +3,14 @@ import re
 from sqlalchemy.sql import text
 
 from miniUtils import QueryType
+from appSettings import miniSettings as ms
 from configManager import masterDataConfig as cfg
 from databaseConnection import miniDbConnection as dbConn
 from errorManager import miniErrorManager as em
 from errorManager import ReturnCode
 from argumentClassifier import ArgumentClassifier
+from resultRenderers import TableRenderer, TabRenderer, VerticalRenderer, CsvWriter, NdjsonWriter, ArrowWriter, PeekedResult
+from resultCache import ResultCache, miniResultCache as resultCache
 
 class QueryProcessor:
 
@@ -130,67 +133,79 @@ class QueryProcessor:
         if em.getError() != ReturnCode.SUCCESS:
             return em.getError()
 
-        # Try to execute the query, handling any exceptions thrown by the API.
-        # Further information about exceptions is available in the SQLAlchemy help and website.
-        from sqlalchemy.exc import DBAPIError
-        try:
-            resultSet = conn.execute(text(self.query))
-        except DBAPIError as e:
-            return em.setException(e, "Error/exception thrown by %s driver" % dbConn.getDialect())
+        # Repeated SELECTs can be answered from the result cache. The -nocache
+        # option bypasses it for a single query.
+        useCache = ms.settings.as_bool('resultCache') and self._queryType == QueryType.SELECT \
+                    and 'nocache' not in self._arguments._options and ResultCache.isCacheable(self.query)
+        # A SELECT can be streamed from a server-side cursor so that the driver
+        # never holds more than a batch of rows; every display format prints
+        # its rows batch by batch.
+        streaming = self._queryType == QueryType.SELECT and ms.settings.as_bool('streamResults')
+        batchSize = int(ms.settings['streamBatchSize' if streaming else 'fetchBatchSize'])
+
+        resultSet = None
+        if useCache:
+            resultCache.setBudget(int(ms.settings['resultCacheBytes']))
+            cacheKey = resultCache.key(self.query, ms.settings['database'], conn.engine)
+            resultSet = resultCache.get(cacheKey)
+
+        if resultSet is None:
+            # Try to execute the query, handling any exceptions thrown by the API.
+            # Further information about exceptions is available in the SQLAlchemy help and website.
+            from sqlalchemy.exc import DBAPIError
+            try:
+                if streaming:
+                    resultSet = conn.execution_options(stream_results=True).execute(text(self.query))
+                else:
+                    resultSet = conn.execute(text(self.query))
+            except DBAPIError as e:
+                return em.setException(e, "Error/exception thrown by %s driver" % dbConn.getDialect())
+
+            # Drop the cached results this statement may have changed. Statements
+            # other than DML and SELECTs (DDL, CALL, ROLLBACK ...) could change anything.
+            if self._queryType in [QueryType.UPDATE, QueryType.INSERT, QueryType.DELETE]:
+                resultCache.invalidate(self.query)
+            elif self._queryType != QueryType.SELECT:
+                resultCache.clear()
+            elif useCache:
+                # Keep a copy of the rows as they are displayed
+                resultSet = resultCache.record(cacheKey, self.query, resultSet)
 
         # Displaying a result set only makes sense for SELECTs that found stg
         if self._queryType != QueryType.SELECT:
             return ReturnCode.SUCCESS
-        if resultSet.rowcount == 0:
+        try:
+            return self._displayResult(resultSet, batchSize)
+        finally:
+            # Release the cursor, a server-side one in particular, even when
+            # the output was cut short
+            resultSet.close()
+
+    def _displayResult(self, resultSet, batchSize):
+        # A streamed (server-side) cursor only knows it is empty once read
+        firstRows = resultSet.fetchmany(batchSize)
+        if not firstRows:
             return em.setError(ReturnCode.EMPTY_RESULT_SET)
+        resultSet = PeekedResult(resultSet, firstRows)
+
+        # Machine-readable formats, written batch by batch to the binary stdout
+        for (option, writerClass) in [('csv', CsvWriter), ('ndjson', NdjsonWriter), ('arrow', ArrowWriter)]:
+            if option in self._arguments._options:
+                return writerClass(resultSet, batchSize).render()
 
-        columnHdrs = resultSet.keys()
-        columnCount = len(columnHdrs)
         if 'tab' in self._arguments._options:
-            print(*columnHdrs, sep='\t')
-            format = '\t'.join(['%s']*columnCount)
-            while True:
-                # don't use too much memory
-                rows = resultSet.fetchmany()
-                if not rows:
-                    break
-                for row in rows:
-                    print(format % tuple(map(lambda v: 'NULL' if v is None else v, row.values())))
+            TabRenderer(resultSet, batchSize).render()
             return ReturnCode.SUCCESS
         else:
-            types = resultSet._cursor_description()
-            columnWidths = [max(types[i][2], len(columnHdrs[i])) # [2] = display_size
-                            for i in range(columnCount)]
-
             if 'vertical' in self._arguments._options:
-                nameWidth = max(map(len,columnHdrs))
-                # Format is "column header : value" repeated over the columns.
-                # In the next line we precompute the format pieces and concat.
-                format = '\n'.join(['{0:>{width}}: %s'.
-                            format(h, width=nameWidth) for h in columnHdrs])
-                while True:
-                    rows = resultSet.fetchmany()
-                    if not rows:
-                        break
-                    for count,row in enumerate(rows):
-                        # The banner: * is fill, ^ is centering, 62 is width,
-                        # all to mimic mysql's behavior
-                        print('{0:*^62}'.format(' %d. row ' % count))
-                        # The data: write the values into the prepared format
-                        print(format % tuple(map(lambda v: 'NULL' if v is None else v, row.values())))
-
+                VerticalRenderer(resultSet, batchSize).render()
                 return ReturnCode.SUCCESS
 
-            # Fetch all rows at once. A fetchmany() loop would use less memory
-            # but would not allow us to adjust the column widths for NULLs
-            rows = resultSet.fetchall()
-
-            # If necessary, widen columns to accommodate NULLs
-            for col in range(columnCount):
-                if columnWidths[col] < 4:
-                    columnHasNull = any([row[col] is None for row in rows])
-                    if columnHasNull:
-                        columnWidths[col] = 4
+            # Settle the column widths from the cursor metadata and a bounded
+            # look-ahead sample so the rows can then be streamed in batches
+            renderer = TableRenderer(resultSet, batchSize, int(ms.settings['widthSampleSize']))
+            columnHdrs = renderer.columnHdrs
+            columnWidths = renderer.columnWidths
 
             # Wrapless or word-wrapped printout
             try:
@@ -198,17 +213,11 @@ class QueryProcessor:
             except OSError:
                 # Screen width is unavailable when stdout is not a tty (i.e. redirection)
                 screenWidth = 999999
-            if 'nowrap' in self._arguments._options or sum(columnWidths) + columnCount < screenWidth:
-                format = " ".join(["%%-%ss" % l for l in columnWidths])
-                result = [format % tuple(columnHdrs)]
-                result.append('')
-                for row in rows:
-                    result.append(format % tuple(map(lambda v:'NULL' if v is None else v, row.values())))
-                print("\n".join(result))
+            if 'nowrap' in self._arguments._options or sum(columnWidths) + renderer.columnCount < screenWidth:
+                renderer.render()
                 return ReturnCode.SUCCESS
             elif 'wrap' in self._arguments._options:
                 # Choose a helper column to make the wrap more readable
-                from appSettings import miniSettings; ms = miniSettings
                 dbCfg = tableCfg = None
                 try:
                     dbCfg = cfg.databases[ms.settings['database']]
@@ -224,72 +233,10 @@ class QueryProcessor:
                     helpColumn = columnHdrs.index(tableCfg.config['primaryColumn'])
                 else:
                     helpColumn = 0
-                helpColumnName = columnHdrs[helpColumn]
-
-                # Wrap repeatedly until done
-                lastColumn = -1
-                includeHelp = False   # Do not alter top row with help column
-                finishedWrapping = False
-                while not finishedWrapping:
-
-                    # Initialize the next text block
-                    lastColumn = firstColumn = lastColumn + 1
-                    totalWidth = 0
-                    if includeHelp:
-                        totalWidth = columnWidths[helpColumn] + 1
-
-                    # Decide what columns will be included
-                    while True:
-                        # Omit help if it would be too close to itself
-                        if includeHelp and lastColumn - firstColumn < 3 \
-                        and helpColumnName == columnHdrs[lastColumn]:
-                            totalWidth -= columnWidths[helpColumn] + 1
-                            includeHelp = False
-                        # Check the proposed width against the constraint
-                        newWidth = totalWidth + columnWidths[lastColumn] + 1
-                        if newWidth > screenWidth:
-                            if lastColumn > firstColumn:
-                                # Toss the last column and don't update width
-                                lastColumn -= 1
-                                break
-                            else:
-                                # Toss the help but keep the column no matter its width
-                                if includeHelp:
-                                    totalWidth -= columnWidths[helpColumn] + 1
-                                    includeHelp = False
-                                    print('last: ' + str(lastColumn) + ' count: ' + str(columnCount))
-                                    if lastColumn == columnCount - 1:
-                                        finishedWrapping = True
-                                        break
-                                break
-                        else:
-                            totalWidth = newWidth
-                            if lastColumn == columnCount - 1:
-                                finishedWrapping = True
-                                break
-                            else:
-                                lastColumn += 1
-                                # Do not break
-
-                    # Print the text block
-                    columnList = [helpColumn] + list(range(firstColumn, lastColumn+1)) \
-                            if includeHelp else list(range(firstColumn, lastColumn+1))
-                    format = " ".join(["%%-%ss" % columnWidths[i] for i in columnList])
-                    result = [format % tuple(columnHdrs[i] for i in columnList)]
-                    result.append('')
-                    for row in rows:
-                        v = row.values()
-                        result.append(format % tuple([v[i] or 'NULL' for i in columnList]))
-                    result.append('')
-                    print("\n".join(result))
-                    columnList.clear()
-                    if finishedWrapping:
-                        break
-
-                    # Turn help on by default for the next chunk
-                    includeHelp = True
 
-                # The result has been fully printed out in chunks
+                # Reuse the sampled rows and settled widths, printing the
+                # result in column blocks one batch at a time
+                renderer.renderWrapped(helpColumn, screenWidth)
                 return ReturnCode.SUCCESS
 
 class HiddenQueryProcessor(QueryProcessor):
@@ -0,0 +1,293 @@
+import re
+import sys
+import threading
+from collections import OrderedDict
+
+# Statements whose results depend on more than the table contents, or that
+# have effects of their own, are never cached
+UNCACHEABLE_SQL_RE = re.compile(r'''\b(?:now|sysdate|curdate|curtime|current_date|current_time
+            |current_timestamp|localtime|localtimestamp|unix_timestamp|utc_\w+|rand|uuid\w*
+            |connection_id|last_insert_id|found_rows|row_count|sleep|get_lock|benchmark)\s*\(
+            |\bfor\s+update\b|\block\s+in\s+share\s+mode\b|\binto\b''', re.I | re.X)
+
+# Quoted strings, and backquoted identifiers (group 1)
+SQL_QUOTED_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"|(`[^`]*`)")
+# The tokens of SQL text outside string literals: backquoted names, bare words
+# and single punctuation characters
+SQL_TOKEN_RE = re.compile(r'`[^`]*`|[A-Za-z_$][\w$]*|[^\s\w`]')
+# Keywords followed by a table reference, in queries and in DML
+SQL_TABLE_KEYWORDS = frozenset(['from', 'join', 'update', 'into'])
+# Modifiers that may stand between such a keyword and the table
+SQL_TABLE_MODIFIERS = frozenset(['low_priority', 'high_priority', 'delayed', 'ignore', 'quick', 'only'])
+# Words that end a table reference, and so cannot be a table alias
+SQL_CLAUSE_KEYWORDS = frozenset(['where', 'join', 'inner', 'left', 'right', 'outer', 'cross',
+            'natural', 'straight_join', 'on', 'using', 'group', 'order', 'limit', 'having',
+            'union', 'set', 'values', 'value', 'select', 'window', 'partition', 'lock', 'for',
+            'into', 'from', 'use', 'force', 'procedure', 'returning'])
+# Whitespace around punctuation, dropped by normalize()
+SQL_PUNCTUATION_SPACE_RE = re.compile(r'\s*([,()=])\s*')
+
+class CachedResult:
+    '''
+    A stored result set replayed through the part of the SQLAlchemy result
+    interface used by the renderers: keys(), fetchmany(), rowcount and the
+    cursor description.
+    '''
+
+    def __init__(self, keys, description, rowcount, rows):
+        self._keys = keys
+        self._description = description
+        self.rowcount = rowcount
+        self._rows = rows
+        self._position = 0
+
+    def keys(self):
+        return self._keys
+
+    def _cursor_description(self):
+        return self._description
+
+    def close(self):
+        self._position = len(self._rows)
+
+    def fetchmany(self, size=None):
+        start = self._position
+        self._position = len(self._rows) if size is None else min(start + size, len(self._rows))
+        return self._rows[start:self._position]
+
+
+class RecordingResult:
+    '''
+    Wraps a live result set, passing its rows through unchanged while keeping
+    a copy. When the rows run out the copy is handed to onComplete(). Recording
+    is abandoned, and nothing is stored, once the copy outgrows byteLimit.
+    '''
+
+    def __init__(self, resultSet, byteLimit, onComplete):
+        self._resultSet = resultSet
+        self._byteLimit = byteLimit
+        self._onComplete = onComplete
+        self._rows = []
+        self._size = 0
+        self.rowcount = resultSet.rowcount
+
+    def keys(self):
+        return self._resultSet.keys()
+
+    def _cursor_description(self):
+        return self._resultSet._cursor_description()
+
+    def close(self):
+        self._resultSet.close()
+
+    def fetchmany(self, size=None):
+        rows = self._resultSet.fetchmany() if size is None else self._resultSet.fetchmany(size)
+        if self._rows is not None:
+            if rows:
+                rows = [tuple(row) for row in rows]
+                self._rows.extend(rows)
+                self._size += sum([ResultCache.rowSize(row) for row in rows])
+                if self._size > self._byteLimit:
+                    self._rows = None
+            else:
+                recorded, self._rows = self._rows, None
+                self._onComplete(CachedResult(list(self.keys()),
+                        [tuple(d) for d in self._cursor_description()],
+                        self.rowcount, recorded), self._size)
+        return rows
+
+
+class ResultCache:
+    '''
+    LRU cache of SELECT results keyed by the normalized SQL text, the database
+    and the engine the query ran on, holding at most budget bytes (estimated
+    with sys.getsizeof).
+
+    Entries are invalidated by the statements run through MINIQUERY itself:
+    every entry is filed under the names of the tables its SQL reads (those
+    after FROM and JOIN), and a DML statement drops the entries filed under
+    the tables it names (after UPDATE, INTO, FROM and JOIN). A DML statement
+    whose tables cannot be told, and any other kind of statement (DDL, CALL,
+    ROLLBACK ...), clears the cache. Changes made by other sessions, triggers or cascading
+    foreign keys are not seen; use the -nocache option or "cache clear".
+
+    The cache may be used by several threads at once (parallel "source").
+    '''
+
+    # No single result may take more than this share of the budget
+    MAX_ENTRY_FRACTION = 0.25
+    ENTRY_OVERHEAD = 200
+
+    def __init__(self, budget=0):
+        self._budget = budget
+        self._entries = OrderedDict()    # key -> (CachedResult, size, tables)
+        self._keysByTable = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def rowSize(row):
+        return sys.getsizeof(row) + sum([sys.getsizeof(v) for v in row])
+
+    @staticmethod
+    def normalize(sql):
+        '''
+        Collapse the whitespace outside quotes and drop any trailing semicolon,
+        so that trivially different spellings of a query share an entry
+        '''
+        def squeeze(s):
+            return SQL_PUNCTUATION_SPACE_RE.sub(r'\1', ' '.join(s.split()))
+        pieces = []
+        position = 0
+        for m in SQL_QUOTED_RE.finditer(sql):
+            pieces.append(squeeze(sql[position:m.start()]))
+            pieces.append(m.group(0))
+            position = m.end()
+        pieces.append(squeeze(sql[position:]))
+        return ''.join(pieces).rstrip('; ')
+
+    @staticmethod
+    def tableNames(sql):
+        '''
+        The lower-cased names of the tables a statement refers to after FROM,
+        JOIN, UPDATE or INTO, without any database qualifier. Functions such
+        as EXTRACT(... FROM x) may add names that are not tables, which only
+        costs the odd needless invalidation.
+        '''
+        tokens = []
+        position = 0
+        for m in SQL_QUOTED_RE.finditer(sql):
+            tokens.extend(SQL_TOKEN_RE.findall(sql[position:m.start()]))
+            if m.group(1):
+                tokens.append(m.group(1))
+            else:
+                tokens.append("''")
+            position = m.end()
+        tokens.extend(SQL_TOKEN_RE.findall(sql[position:]))
+
+        def isName(token):
+            return token[0] == '`' or token[0].isalpha() or token[0] in '_$'
+
+        tables = set()
+        count = len(tokens)
+        i = 0
+        while i < count:
+            keyword = tokens[i].lower()
+            i += 1
+            if keyword not in SQL_TABLE_KEYWORDS:
+                continue
+            while i < count and tokens[i].lower() in SQL_TABLE_MODIFIERS:
+                i += 1
+            # A comma-separated list of [db.]table [[AS] alias] references
+            while i < count and isName(tokens[i]):
+                name = tokens[i]
+                i += 1
+                if i + 1 < count and tokens[i] == '.' and isName(tokens[i+1]):
+                    name = tokens[i+1]
+                    i += 2
+                tables.add(name.strip('`').lower())
+                if i < count and tokens[i].lower() == 'as':
+                    i += 1
+                if i < count and isName(tokens[i]) and tokens[i].lower() not in SQL_CLAUSE_KEYWORDS:
+                    i += 1
+                if i < count and tokens[i] == ',' and keyword in ('from', 'update'):
+                    i += 1
+                else:
+                    break
+        return tables
+
+    @staticmethod
+    def isCacheable(sql):
+        return sql.lstrip().partition(' ')[0].lower() == 'select' \
+                and not UNCACHEABLE_SQL_RE.search(sql)
+
+    def setBudget(self, budget):
+        with self._lock:
+            self._budget = budget
+            self._evict()
+
+    def key(self, sql, dbName, engine):
+        return (self.normalize(sql), dbName, id(engine))
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            result = entry[0]
+            return CachedResult(result._keys, result._description, result.rowcount, result._rows)
+
+    def record(self, key, sql, resultSet):
+        '''
+        Wrap a live result set so that its rows are stored once fully read
+        '''
+        def store(result, size):
+            self._put(key, sql, result, size)
+        return RecordingResult(resultSet, int(self._budget * self.MAX_ENTRY_FRACTION), store)
+
+    def _put(self, key, sql, result, size):
+        size += self.ENTRY_OVERHEAD
+        if size > self._budget * self.MAX_ENTRY_FRACTION:
+            return
+        tables = self.tableNames(sql)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (result, size, tables)
+            for table in tables:
+                self._keysByTable.setdefault(table, set()).add(key)
+            self.size += size
+            self._evict()
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        result, size, tables = entry
+        for table in tables:
+            keys = self._keysByTable[table]
+            keys.discard(key)
+            if not keys:
+                del self._keysByTable[table]
+        self.size -= size
+        return True
+
+    def _evict(self):
+        while self._entries and self.size > self._budget:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def invalidate(self, sql):
+        '''
+        Drop the entries that may read a table written by a DML statement
+        '''
+        tables = self.tableNames(sql)
+        if not tables:
+            self.clear()
+            return
+        with self._lock:
+            keys = set()
+            for table in tables:
+                keys.update(self._keysByTable.get(table, ()))
+            for key in keys:
+                if self._remove(key):
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._keysByTable.clear()
+            self.size = 0
+
+# The global instance
+miniResultCache = ResultCache()
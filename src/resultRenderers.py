@@ -0,0 +1,493 @@
+import re
+import sys
+import json
+import math
+import base64
+import decimal
+import datetime
+
+from errorManager import miniErrorManager, ReturnCode; em = miniErrorManager
+
+class BatchFormatter:
+    '''
+    Turns a batch of rows into columns of strings, one pass per column. The
+    formatter of a column is looked up once, from the type of its first
+    non-null value, and mapped over the whole column; a value of another type
+    (sqlite columns are not uniformly typed) gets its own lookup.
+    '''
+
+    def __init__(self, columnCount, formatters, defaultFormat=str, nullText='NULL'):
+        self._formatters = formatters
+        self._defaultFormat = defaultFormat
+        self._nullText = nullText
+        self._columnTypes = [None] * columnCount
+
+    def formatValue(self, value):
+        if value is None:
+            return self._nullText
+        return self._formatters.get(type(value), self._defaultFormat)(value)
+
+    def formatColumns(self, rows):
+        columns = []
+        nullText = self._nullText
+        for col, values in enumerate(zip(*rows)):
+            columnType = self._columnTypes[col]
+            if columnType is None:
+                columnType = next((type(v) for v in values if v is not None), None)
+                if columnType is None:
+                    columns.append([nullText] * len(values))
+                    continue
+                self._columnTypes[col] = columnType
+
+            formatter = self._formatters.get(columnType, self._defaultFormat)
+            formatValue = self.formatValue
+            columns.append([formatter(v) if type(v) is columnType else formatValue(v)
+                                for v in values])
+        return columns
+
+
+def _displayBytes(v):
+    return v.decode('utf-8', 'backslashreplace')
+
+# Formatters for the human-readable displays. Types not listed use str().
+DISPLAY_FORMATTERS = {
+    str     : str,
+    int     : int.__repr__,
+    float   : float.__repr__,
+    bytes   : _displayBytes,
+}
+
+class PeekedResult:
+    '''
+    Wraps a live result set whose first rows were fetched ahead, e.g. to tell
+    whether it is empty: a server-side cursor reports no rowcount until it is
+    read. The rows fetched ahead are handed out again before any others.
+    '''
+
+    def __init__(self, resultSet, rows):
+        self._resultSet = resultSet
+        self._rows = list(rows)
+        self.rowcount = resultSet.rowcount
+
+    def keys(self):
+        return self._resultSet.keys()
+
+    def _cursor_description(self):
+        return self._resultSet._cursor_description()
+
+    def close(self):
+        self._rows = []
+        self._resultSet.close()
+
+    def fetchmany(self, size=None):
+        if not self._rows:
+            return self._resultSet.fetchmany() if size is None else self._resultSet.fetchmany(size)
+        if size is None:
+            size = len(self._rows)
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        if len(rows) < size:
+            rows += self._resultSet.fetchmany(size - len(rows))
+        return rows
+
+class ResultRenderer:
+    '''
+    Base class for the result set printers. Rows are pulled from the result set
+    in fetchmany() batches so that memory use is capped by the batch size, not
+    by the size of the result. A bounded look-ahead sample is taken up front
+    for renderers that need to see some data before they print anything.
+    Each batch is turned into columns of strings by a BatchFormatter, so that
+    every format prints NULLs and values the same way.
+    '''
+
+    def __init__(self, resultSet, batchSize, sampleSize=0):
+        self._resultSet = resultSet
+        self._batchSize = batchSize
+        self.columnHdrs = list(resultSet.keys())
+        self.columnCount = len(self.columnHdrs)
+        self._sample = resultSet.fetchmany(sampleSize) if sampleSize > 0 else []
+        self.formatter = self._makeFormatter()
+
+    def _makeFormatter(self):
+        return BatchFormatter(self.columnCount, DISPLAY_FORMATTERS)
+
+    def batches(self):
+        '''
+        Yield the rows batch by batch, starting with the look-ahead sample
+        '''
+        if self._sample:
+            sample, self._sample = self._sample, []
+            yield sample
+        while True:
+            rows = self._resultSet.fetchmany(self._batchSize)
+            if not rows:
+                break
+            yield rows
+
+    def columnBatches(self):
+        '''
+        Yield each batch as a list of formatted columns
+        '''
+        for rows in self.batches():
+            yield self.formatter.formatColumns(rows)
+
+
+class TableRenderer(ResultRenderer):
+    '''
+    Streams a result set as a wrapless, fixed-width table. The column widths
+    are settled before the first row is printed, using the cursor metadata
+    plus the look-ahead sample. Values wider than their column in the unsampled
+    remainder simply overflow, as they would in the mysql client.
+    '''
+
+    NULL_WIDTH = len('NULL')
+
+    def __init__(self, resultSet, batchSize, sampleSize):
+        super().__init__(resultSet, batchSize, sampleSize)
+        self.columnWidths = self._computeColumnWidths()
+
+    def _computeColumnWidths(self):
+        types = self._resultSet._cursor_description()
+        sampleColumns = self.formatter.formatColumns(self._sample) if self._sample else []
+        columnWidths = []
+        for col in range(self.columnCount):
+            # [2] = display_size, [6] = null_ok. Not every driver populates these.
+            width = max(types[col][2] or 0, len(self.columnHdrs[col]))
+            if width < self.NULL_WIDTH and len(types[col]) > 6 and types[col][6]:
+                width = self.NULL_WIDTH
+            if sampleColumns:
+                width = max(width, max(map(len, sampleColumns[col])))
+            columnWidths.append(width)
+        return columnWidths
+
+    def _padColumns(self, columns):
+        return [[s.ljust(width) for s in column]
+                    for column, width in zip(columns, self.columnWidths)]
+
+    def render(self, outFile=None):
+        outFile = outFile or sys.stdout
+        outFile.write(' '.join([h.ljust(width) for h, width in zip(self.columnHdrs, self.columnWidths)])
+                        + '\n\n')
+        for columns in self.columnBatches():
+            outFile.write('\n'.join(map(' '.join, zip(*self._padColumns(columns)))))
+            outFile.write('\n')
+        outFile.flush()
+
+    def _planBlocks(self, helpColumn, screenWidth):
+        '''
+        Decide which columns go in each block. Returns a list of column-index lists.
+        '''
+        columnWidths = self.columnWidths
+        columnHdrs = self.columnHdrs
+        columnCount = self.columnCount
+        helpColumnName = columnHdrs[helpColumn]
+        blocks = []
+
+        # Wrap repeatedly until done
+        lastColumn = -1
+        includeHelp = False   # Do not alter top row with help column
+        while True:
+
+            # Initialize the next text block
+            lastColumn = firstColumn = lastColumn + 1
+            totalWidth = 0
+            if includeHelp:
+                totalWidth = columnWidths[helpColumn] + 1
+
+            # Decide what columns will be included
+            while True:
+                # Omit help if it would be too close to itself
+                if includeHelp and lastColumn - firstColumn < 3 \
+                and helpColumnName == columnHdrs[lastColumn]:
+                    totalWidth -= columnWidths[helpColumn] + 1
+                    includeHelp = False
+                # Check the proposed width against the constraint
+                newWidth = totalWidth + columnWidths[lastColumn] + 1
+                if newWidth > screenWidth:
+                    if lastColumn > firstColumn:
+                        # Toss the last column and don't update width
+                        lastColumn -= 1
+                    elif includeHelp:
+                        # Toss the help but keep the column no matter its width
+                        totalWidth -= columnWidths[helpColumn] + 1
+                        includeHelp = False
+                    break
+                totalWidth = newWidth
+                if lastColumn == columnCount - 1:
+                    break
+                lastColumn += 1
+
+            blocks.append([helpColumn] + list(range(firstColumn, lastColumn+1))
+                            if includeHelp else list(range(firstColumn, lastColumn+1)))
+            if lastColumn == columnCount - 1:
+                break
+
+            # Turn help on by default for the next chunk
+            includeHelp = True
+
+        return blocks
+
+    def renderWrapped(self, helpColumn, screenWidth, outFile=None):
+        '''
+        Print a table too wide for the screen as a series of column blocks, each
+        block repeating a "help" column to keep the rows recognizable. Each
+        fetched batch is converted into padded per-column string arrays once,
+        and every block is assembled by slicing those arrays. Since the result
+        is processed batch by batch, the blocks repeat once per batch.
+        '''
+        outFile = outFile or sys.stdout
+        blocks = self._planBlocks(helpColumn, screenWidth)
+        columnWidths = self.columnWidths
+        headers = [' '.join([self.columnHdrs[i].ljust(columnWidths[i]) for i in block])
+                    for block in blocks]
+
+        for columns in self.columnBatches():
+            # Pad every value of the batch exactly once, column by column
+            paddedColumns = self._padColumns(columns)
+
+            for header, block in zip(headers, blocks):
+                lines = [header, '']
+                lines.extend(map(' '.join, zip(*[paddedColumns[i] for i in block])))
+                lines.append('')
+                outFile.write('\n'.join(lines) + '\n')
+        outFile.flush()
+
+
+class TabRenderer(ResultRenderer):
+    '''
+    Tab-separated values with a header line, as printed by "mysql -B"
+    '''
+
+    def render(self, outFile=None):
+        outFile = outFile or sys.stdout
+        outFile.write('\t'.join(self.columnHdrs) + '\n')
+        for columns in self.columnBatches():
+            outFile.write('\n'.join(map('\t'.join, zip(*columns))) + '\n')
+        outFile.flush()
+
+
+class VerticalRenderer(ResultRenderer):
+    '''
+    One "column: value" line per column, each row under a numbered banner,
+    like the mysql client's \\G output
+    '''
+
+    def render(self, outFile=None):
+        outFile = outFile or sys.stdout
+        nameWidth = max(map(len, self.columnHdrs))
+        labels = [h.rjust(nameWidth) + ': ' for h in self.columnHdrs]
+        rowNumber = 0
+        for columns in self.columnBatches():
+            labelled = [[label + s for s in column] for label, column in zip(labels, columns)]
+            lines = []
+            for fields in zip(*labelled):
+                rowNumber += 1
+                # The banner: * is fill, ^ is centering, 62 is width, all to mimic mysql
+                lines.append('{0:*^62}'.format(' %d. row ' % rowNumber))
+                lines.extend(fields)
+            outFile.write('\n'.join(lines) + '\n')
+        outFile.flush()
+
+
+class StreamWriter(ResultRenderer):
+    '''
+    Base class for the machine-readable output formats. Each fetched batch is
+    formatted column by column and then written to a binary stream in a
+    single call.
+    '''
+
+    ENCODING = 'utf-8'
+    NULL_TEXT = ''
+    # Python type -> formatter; subclasses fill this in
+    FORMATTERS = {}
+
+    def _makeFormatter(self):
+        return BatchFormatter(self.columnCount, self.FORMATTERS, self._defaultFormat, self.NULL_TEXT)
+
+    def _defaultFormat(self, value):
+        return str(value)
+
+    def _header(self):
+        return ''
+
+    def _formatBatch(self, columns):
+        raise NotImplementedError
+
+    def render(self, outFile=None):
+        '''
+        Write the whole result set. The default output is the binary buffer
+        underneath stdout, bypassing the text layer.
+        '''
+        if outFile is None:
+            sys.stdout.flush()
+            outFile = sys.stdout.buffer
+        outFile.write(self._header().encode(self.ENCODING, 'surrogateescape'))
+        for columns in self.columnBatches():
+            outFile.write(self._formatBatch(columns).encode(self.ENCODING, 'surrogateescape'))
+        outFile.flush()
+        return ReturnCode.SUCCESS
+
+
+CSV_SPECIAL_RE = re.compile(r'[",\r\n]')
+
+def _csvQuote(s):
+    if not s:
+        # Quote empty strings to tell them apart from NULLs
+        return '""'
+    if CSV_SPECIAL_RE.search(s):
+        return '"' + s.replace('"', '""') + '"'
+    return s
+
+class CsvWriter(StreamWriter):
+    '''
+    RFC 4180 CSV: comma-separated, CRLF line endings, fields holding commas,
+    quotes or line breaks enclosed in double quotes. NULL is an empty field.
+    Binary values are written through as raw bytes.
+    '''
+
+    LINE_END = '\r\n'
+    FORMATTERS = {
+        str     : _csvQuote,
+        bytes   : lambda v: _csvQuote(v.decode('utf-8', 'surrogateescape')),
+        int     : int.__repr__,
+        float   : float.__repr__,
+    }
+
+    def _defaultFormat(self, value):
+        return _csvQuote(str(value))
+
+    def _header(self):
+        return ','.join([_csvQuote(h) for h in self.columnHdrs]) + self.LINE_END
+
+    def _formatBatch(self, columns):
+        lineEnd = self.LINE_END
+        return lineEnd.join(map(','.join, zip(*columns))) + lineEnd
+
+
+def _jsonFloat(v):
+    return float.__repr__(v) if math.isfinite(v) else 'null'
+
+def _jsonDecimal(v):
+    return str(v) if v.is_finite() else 'null'
+
+def _jsonQuotedText(v):
+    return '"' + str(v) + '"'
+
+class NdjsonWriter(StreamWriter):
+    '''
+    Newline-delimited JSON: one object per row, keyed by column name.
+    Dates and times are written as ISO strings, binary values in base64.
+    '''
+
+    NULL_TEXT = 'null'
+    FORMATTERS = {
+        str                 : json.encoder.encode_basestring,
+        int                 : int.__repr__,
+        bool                : lambda v: 'true' if v else 'false',
+        float               : _jsonFloat,
+        decimal.Decimal     : _jsonDecimal,
+        datetime.datetime   : lambda v: '"' + v.isoformat() + '"',
+        datetime.date       : lambda v: '"' + v.isoformat() + '"',
+        datetime.time       : lambda v: '"' + v.isoformat() + '"',
+        datetime.timedelta  : _jsonQuotedText,
+        bytes               : lambda v: '"' + base64.b64encode(v).decode('ascii') + '"',
+    }
+
+    def __init__(self, resultSet, batchSize):
+        super().__init__(resultSet, batchSize)
+        # The '{"key":' prefixes of every field, encoded once
+        self._keys = ['{' + json.encoder.encode_basestring(self.columnHdrs[0]) + ':'] + \
+                     [',' + json.encoder.encode_basestring(h) + ':' for h in self.columnHdrs[1:]]
+
+    def _defaultFormat(self, value):
+        return json.encoder.encode_basestring(str(value))
+
+    def _formatBatch(self, columns):
+        keys = self._keys
+        # Interleave the keys with the value columns, then join each row
+        fields = [c for pair in zip([[k] * len(columns[0]) for k in keys], columns) for c in pair]
+        return '}\n'.join(map(''.join, zip(*fields))) + '}\n'
+
+
+class ArrowWriter(ResultRenderer):
+    '''
+    Apache Arrow IPC stream: one record batch per fetched batch. The schema is
+    inferred by pyarrow from the first batch (the look-ahead sample); a column
+    that is entirely NULL there is typed as string, and decimals get the
+    widest precision. A stream cannot change its schema, so the values of the
+    later batches are converted to the types of the first one. A value that
+    cannot be converted without loss ends the stream cleanly, short of the
+    remaining rows, and is reported. Requires the optional pyarrow package.
+    '''
+
+    @staticmethod
+    def _firstArray(pyarrow, values):
+        array = pyarrow.array(values)
+        if pyarrow.types.is_null(array.type):
+            return pyarrow.array(values, type=pyarrow.string())
+        if pyarrow.types.is_decimal(array.type) and array.type.precision < 38:
+            # The precision inferred fits the sample only
+            return array.cast(pyarrow.decimal128(38, array.type.scale))
+        return array
+
+    @staticmethod
+    def _convertedArray(pyarrow, values, fieldType):
+        ''' The values as an array of fieldType. Raises ValueError if they do not convert '''
+        if pyarrow.types.is_string(fieldType):
+            return pyarrow.array([None if v is None else str(v) for v in values], type=fieldType)
+        try:
+            return pyarrow.array(values, type=fieldType)
+        except (pyarrow.ArrowException, OverflowError, TypeError):
+            pass
+        try:
+            # E.g. int to float or to decimal: a safe cast fails on any loss
+            return pyarrow.array(values).cast(fieldType)
+        except (pyarrow.ArrowException, OverflowError, TypeError) as e:
+            raise ValueError(e)
+
+    @staticmethod
+    def _typeName(pyarrow, values):
+        try:
+            return str(pyarrow.array(values).type)
+        except (pyarrow.ArrowException, OverflowError, TypeError):
+            return 'mixed'
+
+    def render(self, outFile=None):
+        try:
+            import pyarrow
+        except ImportError:
+            return em.setError(ReturnCode.MISSING_MODULE, 'arrow', 'pyarrow')
+
+        if outFile is None:
+            sys.stdout.flush()
+            outFile = sys.stdout.buffer
+        writer = None
+        retValue = ReturnCode.SUCCESS
+        for rows in self.batches():
+            columns = list(zip(*rows))
+            if writer is None:
+                arrays = [self._firstArray(pyarrow, values) for values in columns]
+                batch = pyarrow.RecordBatch.from_arrays(arrays, names=self.columnHdrs)
+                schema = batch.schema
+                writer = pyarrow.ipc.new_stream(outFile, schema)
+            else:
+                arrays = []
+                for values, field in zip(columns, schema):
+                    try:
+                        arrays.append(self._convertedArray(pyarrow, values, field.type))
+                    except ValueError:
+                        retValue = em.setError(ReturnCode.INCONSISTENT_COLUMN_TYPE, field.name,
+                                        self._typeName(pyarrow, values), field.type, 'arrow')
+                        break
+                if retValue != ReturnCode.SUCCESS:
+                    break
+                batch = pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
+            writer.write_batch(batch)
+
+        if writer is None:
+            # No rows: still write the stream header so readers see the columns
+            schema = pyarrow.schema([(h, pyarrow.string()) for h in self.columnHdrs])
+            writer = pyarrow.ipc.new_stream(outFile, schema)
+        # Always end the stream, so that what was written can be read
+        writer.close()
+        outFile.flush()
+        return retValue
@@ -0,0 +1,226 @@
+'''
+Binary schema cache: one memory-mapped file per database holding the table
+names, the column names/types/defaults of every table, and the foreign-key
+edges. All strings live in a single string table and are referenced by
+(offset, length) pairs, so nothing is parsed until it is asked for.
+
+Layout (little-endian):
+    header      magic, version, counts and section offsets (see HEADER below)
+    strings     UTF-8 bytes of every distinct string, back to back
+    tables      one TABLE_RECORD per table, sorted by name for binary search
+    columns     one COLUMN_RECORD per column, grouped by table in table order
+    foreignKeys one FK_RECORD per edge: table, column, referenced table & column
+'''
+
+import os
+import mmap
+import struct
+
+SCHEMA_CACHE_FILE = 'schema.bin'
+
+# Names of the legacy text cache files that the binary cache is built from
+TEXT_TABLE_LIST_FILE = 'information_schema.tables'
+TEXT_FOREIGN_KEY_FILE = 'information_schema.key_column_usage'
+TEXT_COLUMNS_SUFFIX = '.columns'
+
+class SchemaCache:
+    '''
+    Read-only view of a binary schema cache file
+    '''
+
+    MAGIC = b'MQSC'
+    VERSION = 1
+    # magic, version, reserved, tableCount, columnCount, fkCount,
+    # stringsOffset, tablesOffset, columnsOffset, fksOffset
+    HEADER = struct.Struct('<4sHHIIIIIII')
+    # name, firstColumn, columnCount
+    TABLE_RECORD = struct.Struct('<IIII')
+    # name, type, default
+    COLUMN_RECORD = struct.Struct('<IIIIII')
+    # table, column, referenced table, referenced column
+    FK_RECORD = struct.Struct('<IIIIIIII')
+
+    def __init__(self, fileName):
+        self.fileName = fileName
+        with open(fileName, 'rb') as fp:
+            self._map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, reserved, self.tableCount, self.columnCount, self.fkCount,
+            self._stringsOffset, self._tablesOffset, self._columnsOffset,
+            self._fksOffset) = self.HEADER.unpack_from(self._map, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            self.close()
+            raise ValueError('Unrecognized schema cache file "%s"' % fileName)
+        self._tableNames = None
+
+    def close(self):
+        if self._map:
+            self._map.close()
+            self._map = None
+
+    def _string(self, offset, length):
+        start = self._stringsOffset + offset
+        return self._map[start:start+length].decode('utf-8')
+
+    def _tableRecord(self, index):
+        return self.TABLE_RECORD.unpack_from(self._map,
+                        self._tablesOffset + index * self.TABLE_RECORD.size)
+
+    def _findTable(self, tableName):
+        ''' Binary search on the sorted table records. Returns the index or -1 '''
+        target = tableName.encode('utf-8')
+        lo, hi = 0, self.tableCount
+        while lo < hi:
+            mid = (lo + hi) // 2
+            nameOffset, nameLength, a, b = self._tableRecord(mid)
+            start = self._stringsOffset + nameOffset
+            name = self._map[start:start+nameLength]
+            if name < target:
+                lo = mid + 1
+            elif name > target:
+                hi = mid
+            else:
+                return mid
+        return -1
+
+    def tableNames(self):
+        if self._tableNames is None:
+            self._tableNames = [self._string(*self._tableRecord(i)[:2])
+                                    for i in range(self.tableCount)]
+        return self._tableNames
+
+    def hasTable(self, tableName):
+        return self._findTable(tableName) >= 0
+
+    def columns(self, tableName):
+        '''
+        The (name, type, default) tuples of a table's columns, or None if the
+        table is not in the cache
+        '''
+        index = self._findTable(tableName)
+        if index < 0:
+            return None
+        a, b, firstColumn, columnCount = self._tableRecord(index)
+        recordSize = self.COLUMN_RECORD.size
+        offset = self._columnsOffset + firstColumn * recordSize
+        columns = []
+        for i in range(columnCount):
+            nameOff, nameLen, typeOff, typeLen, defOff, defLen = \
+                    self.COLUMN_RECORD.unpack_from(self._map, offset + i * recordSize)
+            columns.append((self._string(nameOff, nameLen), self._string(typeOff, typeLen),
+                            self._string(defOff, defLen)))
+        return columns
+
+    def foreignKeys(self):
+        ''' List of (table, column, referencedTable, referencedColumn) tuples '''
+        recordSize = self.FK_RECORD.size
+        edges = []
+        for i in range(self.fkCount):
+            refs = self.FK_RECORD.unpack_from(self._map, self._fksOffset + i * recordSize)
+            edges.append(tuple(self._string(refs[j], refs[j+1]) for j in range(0, 8, 2)))
+        return edges
+
+
+def writeSchemaCache(fileName, tables, foreignKeys=()):
+    '''
+    Write a binary schema cache. The file is written under a temporary name
+    and then renamed so that readers never see a partial file.
+
+    :param tables: dict mapping table name to a list of (name, type, default) tuples
+    :param foreignKeys: iterable of (table, column, referencedTable, referencedColumn)
+    '''
+    strings = bytearray()
+    stringRefs = {}
+    def ref(s):
+        if s not in stringRefs:
+            data = (s or '').encode('utf-8')
+            stringRefs[s] = (len(strings), len(data))
+            strings.extend(data)
+        return stringRefs[s]
+
+    tableRecords = bytearray()
+    columnRecords = bytearray()
+    columnCount = 0
+    for tableName in sorted(tables, key=lambda t: t.encode('utf-8')):
+        columns = tables[tableName]
+        tableRecords += SchemaCache.TABLE_RECORD.pack(*ref(tableName), columnCount, len(columns))
+        for column in columns:
+            # Tolerate short tuples from hand-made cache files
+            name, columnType, default = (tuple(column) + ('', ''))[:3]
+            columnRecords += SchemaCache.COLUMN_RECORD.pack(*ref(name), *ref(columnType), *ref(default))
+        columnCount += len(columns)
+
+    fkRecords = bytearray()
+    fkCount = 0
+    for edge in foreignKeys:
+        fkRecords += SchemaCache.FK_RECORD.pack(*[x for s in edge for x in ref(s)])
+        fkCount += 1
+
+    stringsOffset = SchemaCache.HEADER.size
+    tablesOffset = stringsOffset + len(strings)
+    columnsOffset = tablesOffset + len(tableRecords)
+    fksOffset = columnsOffset + len(columnRecords)
+    header = SchemaCache.HEADER.pack(SchemaCache.MAGIC, SchemaCache.VERSION, 0,
+                len(tables), columnCount, fkCount,
+                stringsOffset, tablesOffset, columnsOffset, fksOffset)
+
+    tempName = fileName + '.tmp'
+    with open(tempName, 'wb') as fp:
+        for section in (header, strings, tableRecords, columnRecords, fkRecords):
+            fp.write(section)
+    os.replace(tempName, fileName)
+
+
+def buildSchemaCacheFromText(dbCacheDir):
+    '''
+    Convert a database's tab-separated text cache into the binary format.
+    Returns the name of the binary file, or None if there is no text cache.
+    '''
+    try:
+        with open(os.path.join(dbCacheDir, TEXT_TABLE_LIST_FILE), 'r') as tablesFp:
+            tableNames = [l.rstrip() for l in tablesFp if l.strip()]
+    except FileNotFoundError:
+        return None
+
+    tables = {}
+    for tableName in tableNames:
+        try:
+            with open(os.path.join(dbCacheDir, tableName + TEXT_COLUMNS_SUFFIX), 'r') as columnsFp:
+                tables[tableName] = [tuple(l.rstrip('\n').split('\t')) for l in columnsFp]
+        except FileNotFoundError:
+            tables[tableName] = []
+
+    foreignKeys = []
+    try:
+        with open(os.path.join(dbCacheDir, TEXT_FOREIGN_KEY_FILE), 'r') as fkFp:
+            for line in fkFp:
+                edge = line.split()
+                if len(edge) == 4:
+                    foreignKeys.append(tuple(edge))
+    except FileNotFoundError:
+        pass
+
+    fileName = os.path.join(dbCacheDir, SCHEMA_CACHE_FILE)
+    writeSchemaCache(fileName, tables, foreignKeys)
+    return fileName
+
+
+def openSchemaCache(dbCacheDir):
+    '''
+    Open the binary schema cache of a database, (re)building it from the text
+    cache when it is missing or older than the text table list.
+    Returns None when neither form of the cache is available.
+    '''
+    fileName = os.path.join(dbCacheDir, SCHEMA_CACHE_FILE)
+    textFileName = os.path.join(dbCacheDir, TEXT_TABLE_LIST_FILE)
+    try:
+        isStale = os.path.getmtime(fileName) < os.path.getmtime(textFileName)
+    except FileNotFoundError:
+        isStale = not os.path.isfile(fileName)
+
+    try:
+        if isStale and not buildSchemaCacheFromText(dbCacheDir):
+            return None
+        return SchemaCache(fileName)
+    except (OSError, ValueError, struct.error):
+        # An unreadable or unwritable cache is not fatal; callers fall back on the text cache
+        return None
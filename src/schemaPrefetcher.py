@@ -0,0 +1,90 @@
+import queue
+import threading
+
+from databaseConnection import miniDbConnection; dbConn = miniDbConnection
+from errorManager import miniErrorManager, ReturnCode; em = miniErrorManager
+
+class SchemaPrefetcher:
+    '''
+    Loads the table configs of a database on background threads so that
+    the foreground rarely has to lazy-load one. At most maxWorkers tables are
+    loaded at a time. The tables are handed out in chunks, and each finished
+    chunk is published into DatabaseConfig.tables in one step.
+
+    Prefetching another database abandons the chunks still queued for the
+    previous one. A chunk loaded while the schema was reloaded is discarded.
+    Tables that cannot be loaded in the background (a bad config section, no
+    usable connection yet) are left to be lazy-loaded as before, where any
+    problem is reported to the user.
+    '''
+
+    CHUNK_SIZE = 50
+
+    def __init__(self, maxWorkers):
+        self._maxWorkers = maxWorkers
+        self._queue = queue.Queue()
+        self._threads = []
+        self._generation = 0
+
+    def prefetch(self, dbConfig):
+        self._generation += 1
+        pending = [t for t in dbConfig.tableNames if t not in dbConfig.tables]
+        for i in range(0, len(pending), self.CHUNK_SIZE):
+            self._queue.put((dbConfig, pending[i:i+self.CHUNK_SIZE], self._generation))
+        self._startWorkers()
+
+    def cancel(self):
+        self._generation += 1
+
+    def wait(self):
+        ''' Block until the queued chunks are done '''
+        self._queue.join()
+
+    def _startWorkers(self):
+        # Daemon threads, so that a pending prefetch never delays the exit
+        while len(self._threads) < self._maxWorkers:
+            thread = threading.Thread(target=self._work, name='schemaPrefetcher', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            dbConfig, tableNames, generation = self._queue.get()
+            try:
+                if generation == self._generation:
+                    self._loadChunk(dbConfig, tableNames, generation)
+            finally:
+                self._queue.task_done()
+
+    def _loadChunk(self, dbConfig, tableNames, generation):
+        # Read before loading anything: a schema reloaded from here on
+        # makes publishTables() drop what this chunk loaded
+        schemaGeneration = dbConfig.schemaGeneration
+        loaded = {}
+        connection = None
+        try:
+            for tableName in tableNames:
+                if generation != self._generation:
+                    return
+                if tableName in dbConfig.tables:
+                    continue
+                if not dbConfig.columnsAreCached(tableName):
+                    # The metadata must come from the server, over a connection
+                    # of our own since the foreground one is not ours to share
+                    if connection is None:
+                        connection = dbConn.newConnection(dbConfig.dbName)
+                    if connection is None:
+                        continue
+                tableConfig = dbConfig.loadTable(tableName, connection)
+                if em.getError() == ReturnCode.SUCCESS:
+                    loaded[tableName] = tableConfig
+                else:
+                    em.resetError()
+        except Exception:
+            # Whatever failed here will fail again, visibly, when the table is lazy-loaded
+            em.resetError()
+        finally:
+            if connection:
+                connection.close()
+            if loaded and generation == self._generation:
+                dbConfig.publishTables(loaded, schemaGeneration)
@@ -0,0 +1,188 @@
+'''
+Incremental refresh of a database's schema cache from information_schema.
+
+The change stamp of every table (its create_time and update_time) is kept in
+a text file beside the table list. A refresh reads the current stamps in one
+query, and re-fetches the columns of only the tables whose stamp changed, or
+which are new, in one more query. The text cache files are each replaced
+atomically (written under a temporary name, then renamed), and the binary
+schema cache is rebuilt from the merged result in the same way.
+
+A database with no cache at all is loaded by loadSchema(), which fetches the
+columns of every table in a single query and writes the cache from them.
+'''
+
+import os
+from sqlalchemy.sql import text, bindparam
+
+import miniEnv as env
+from schemaCache import (openSchemaCache, writeSchemaCache, SCHEMA_CACHE_FILE,
+                TEXT_TABLE_LIST_FILE, TEXT_FOREIGN_KEY_FILE, TEXT_COLUMNS_SUFFIX)
+
+TEXT_TABLE_STAMPS_FILE = 'information_schema.table_stamps'
+
+# Beyond this share of the schema, fetching every column is cheaper than a long IN list
+FULL_FETCH_FRACTION = 0.5
+COLUMN_FETCH_BATCH_SIZE = 10000
+
+TABLE_STAMPS_QUERY = text('''SELECT table_name, create_time, update_time
+        FROM information_schema.tables WHERE table_schema = :schema''')
+
+SCHEMA_COLUMNS_QUERY = '''SELECT table_name, column_name, column_type, column_default
+        FROM information_schema.columns WHERE table_schema = :schema{}
+        ORDER BY table_name, ordinal_position'''
+
+FOREIGN_KEYS_QUERY = text('''SELECT table_name, column_name, referenced_table_name, referenced_column_name
+        FROM information_schema.key_column_usage
+        WHERE table_schema = :schema AND referenced_table_name IS NOT NULL
+        ORDER BY table_name, column_name''')
+
+def fetchTableStamps(connection, dbName):
+    ''' Map each table of a database to its change stamp, as a string '''
+    resultSet = connection.execute(TABLE_STAMPS_QUERY, schema=dbName)
+    return dict((row[0], '{}\t{}'.format(row[1] or '', row[2] or ''))
+                    for row in resultSet.fetchall())
+
+def fetchSchemaColumns(connection, dbName, tableNames=None):
+    '''
+    Fetch the (name, type, default) tuples of the columns of the given tables,
+    or of all the tables of the database, in one streamed query.
+    Returns a dict mapping table name to its list of columns.
+    '''
+    if tableNames is None:
+        query = text(SCHEMA_COLUMNS_QUERY.format(''))
+        parameters = {'schema': dbName}
+    else:
+        query = text(SCHEMA_COLUMNS_QUERY.format(' AND table_name IN :tableNames')).bindparams(
+                    bindparam('tableNames', expanding=True))
+        parameters = {'schema': dbName, 'tableNames': list(tableNames)}
+
+    tables = {}
+    resultSet = connection.execution_options(stream_results=True).execute(query, **parameters)
+    try:
+        while True:
+            rows = resultSet.fetchmany(COLUMN_FETCH_BATCH_SIZE)
+            if not rows:
+                break
+            for (tableName, columnName, columnType, columnDefault) in rows:
+                # The text cache spells a missing default as NULL
+                tables.setdefault(tableName, []).append((columnName, columnType,
+                            'NULL' if columnDefault is None else str(columnDefault)))
+    finally:
+        resultSet.close()
+    return tables
+
+def fetchForeignKeys(connection, dbName):
+    ''' List of (table, column, referencedTable, referencedColumn) tuples '''
+    resultSet = connection.execute(FOREIGN_KEYS_QUERY, schema=dbName)
+    return [tuple(row) for row in resultSet.fetchall()]
+
+def readTableStamps(dbCacheDir):
+    try:
+        with open(os.path.join(dbCacheDir, TEXT_TABLE_STAMPS_FILE), 'r') as stampsFp:
+            return dict(l.rstrip('\n').partition('\t')[0::2] for l in stampsFp if l.strip())
+    except FileNotFoundError:
+        return {}
+
+def writeTextCacheFile(fileName, lines):
+    ''' Replace a text cache file atomically '''
+    tempName = fileName + '.tmp'
+    with open(tempName, 'w') as fp:
+        for line in lines:
+            fp.write(line + '\n')
+    os.replace(tempName, fileName)
+
+def readCachedColumns(dbCacheDir, schemaCache, tableName):
+    ''' The cached columns of a table, from the binary cache if it has them '''
+    columns = schemaCache.columns(tableName) if schemaCache else None
+    if columns:
+        return columns
+    try:
+        with open(os.path.join(dbCacheDir, tableName + TEXT_COLUMNS_SUFFIX), 'r') as columnsFp:
+            return [tuple(l.rstrip('\n').split('\t')) for l in columnsFp]
+    except FileNotFoundError:
+        return None
+
+def writeSchemaCacheFiles(dbCacheDir, tables, foreignKeys, stamps, changedTables=None, droppedTables=()):
+    '''
+    Write the text and binary cache of a database. Only the column files of
+    changedTables are rewritten, all of them if it is None; the files of
+    droppedTables are removed.
+    '''
+    os.makedirs(dbCacheDir, exist_ok=True)
+    # Column files first and the stamps last, so that an interrupted refresh
+    # leaves stamps that make the next one fetch the same tables again. The
+    # binary cache is written after the table list it must not be older than.
+    for tableName in (tables if changedTables is None else changedTables):
+        writeTextCacheFile(os.path.join(dbCacheDir, tableName + TEXT_COLUMNS_SUFFIX),
+                    ['\t'.join(column) for column in tables[tableName]])
+    for tableName in droppedTables:
+        try:
+            os.remove(os.path.join(dbCacheDir, tableName + TEXT_COLUMNS_SUFFIX))
+        except FileNotFoundError:
+            pass
+    tableNames = sorted(stamps)
+    writeTextCacheFile(os.path.join(dbCacheDir, TEXT_TABLE_LIST_FILE), tableNames)
+    writeTextCacheFile(os.path.join(dbCacheDir, TEXT_FOREIGN_KEY_FILE),
+                ['\t'.join(edge) for edge in foreignKeys])
+    writeSchemaCache(os.path.join(dbCacheDir, SCHEMA_CACHE_FILE), tables, foreignKeys)
+    writeTextCacheFile(os.path.join(dbCacheDir, TEXT_TABLE_STAMPS_FILE),
+                ['{}\t{}'.format(t, stamps[t]) for t in tableNames])
+
+def loadSchema(connection, dbName):
+    '''
+    Fetch the columns of every table of a database in one streamed query,
+    and write them to the schema cache. The cache is an optimization only,
+    so failing to write it is not an error.
+    Returns a dict mapping each table name to its list of columns.
+    '''
+    stamps = fetchTableStamps(connection, dbName)
+    tables = fetchSchemaColumns(connection, dbName)
+    for tableName in stamps:
+        tables.setdefault(tableName, [])
+    try:
+        writeSchemaCacheFiles(os.path.join(env.MINI_CACHE, dbName), tables,
+                    fetchForeignKeys(connection, dbName), stamps)
+    except OSError:
+        pass
+    return tables
+
+def refreshSchemaCache(connection, dbName, full=False):
+    '''
+    Bring the schema cache of a database up to date with the server.
+    Tables whose stamp is unchanged keep their cached columns, unless full
+    is set, in which case every table is fetched again.
+    Returns the sorted lists of (re)fetched and of dropped table names.
+    '''
+    dbCacheDir = os.path.join(env.MINI_CACHE, dbName)
+    schemaCache = openSchemaCache(dbCacheDir)
+
+    stamps = fetchTableStamps(connection, dbName)
+    cachedStamps = {} if full else readTableStamps(dbCacheDir)
+
+    tables = {}
+    changed = []
+    for tableName in stamps:
+        columns = None
+        if cachedStamps.get(tableName) == stamps[tableName]:
+            columns = readCachedColumns(dbCacheDir, schemaCache, tableName)
+        if columns is None:
+            changed.append(tableName)
+        else:
+            tables[tableName] = columns
+
+    previousTables = set(schemaCache.tableNames()) if schemaCache else set(cachedStamps)
+    dropped = sorted(previousTables.difference(stamps))
+    foreignKeys = fetchForeignKeys(connection, dbName)
+    if not changed and not dropped and schemaCache and foreignKeys == schemaCache.foreignKeys():
+        return [], []
+
+    if len(changed) > FULL_FETCH_FRACTION * len(stamps):
+        fetched = fetchSchemaColumns(connection, dbName)
+    else:
+        fetched = fetchSchemaColumns(connection, dbName, changed) if changed else {}
+    for tableName in changed:
+        tables[tableName] = fetched.get(tableName, [])
+
+    writeSchemaCacheFiles(dbCacheDir, tables, foreignKeys, stamps, changed, dropped)
+    return sorted(changed), dropped
@@ -0,0 +1,20 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from nameIndex import ColumnIndex
+
+def test_table_spelling_a_column_two_ways():
+    index = ColumnIndex()
+    index.setTable('t', [('customerId', 'int'), ('customer_id', 'bigint')])
+    index.setTable('u', [('customer_id', 'int')])
+    assert sorted(index.tablesWithColumn('CustomerID')) == [('t', 'bigint'), ('t', 'int'), ('u', 'int')]
+
+    # Re-indexing and removing the table drop both spellings
+    index.setTable('t', [('x', 'int')])
+    assert index.tablesWithColumn('customer_id') == [('u', 'int')]
+    assert index.tablesWithColumn('x') == [('t', 'int')]
+    index.removeTable('t')
+    index.removeTable('u')
+    assert index.tablesWithColumn('customer_id') == []
+    assert index.columnsWithToken('customer') == []
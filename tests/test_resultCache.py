@@ -0,0 +1,52 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from resultCache import ResultCache
+
+class FakeResultSet:
+    def __init__(self, rows):
+        self._rows = rows
+        self.rowcount = len(rows)
+
+    def keys(self):
+        return ['id']
+
+    def _cursor_description(self):
+        return [('id', None, None, None, None, None, None)]
+
+    def close(self):
+        pass
+
+    def fetchmany(self, size=None):
+        rows, self._rows = self._rows, []
+        return rows
+
+def cacheSelect(cache, sql):
+    key = cache.key(sql, 'db', None)
+    result = cache.record(key, sql, FakeResultSet([(1,), (2,)]))
+    while result.fetchmany(10):
+        pass
+    return key
+
+def test_table_names():
+    assert ResultCache.tableNames(
+            "SELECT a.x FROM db.a AS t1, `b` t2 JOIN c ON c.id = t2.id WHERE y = 'from d'") == {'a', 'b', 'c'}
+    assert ResultCache.tableNames("UPDATE low_priority a SET name = 'x' WHERE id = 1") == {'a'}
+    assert ResultCache.tableNames("DELETE FROM a WHERE id IN (SELECT id FROM b)") == {'a', 'b'}
+    assert ResultCache.tableNames("INSERT INTO a (id) VALUES (1)") == {'a'}
+
+def test_update_keeps_select_on_other_table():
+    cache = ResultCache(budget=1 << 20)
+    keyA = cacheSelect(cache, 'SELECT * FROM a WHERE id = 1')
+    keyB = cacheSelect(cache, 'SELECT * FROM b WHERE id = 1')
+    cache.invalidate("UPDATE a SET name = 'x' WHERE id = 1")
+    assert cache.get(keyA) is None
+    assert cache.get(keyB) is not None
+    assert cache.invalidations == 1
+
+def test_dml_without_table_clears_cache():
+    cache = ResultCache(budget=1 << 20)
+    keyB = cacheSelect(cache, 'SELECT * FROM b')
+    cache.invalidate('DELETE')
+    assert cache.get(keyB) is None
@@ -0,0 +1,29 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from resultRenderers import PeekedResult
+
+class FakeCursor:
+    ''' A streamed result: no rowcount, rows only as fetched '''
+    def __init__(self, rows):
+        self._rows = rows
+        self.rowcount = -1
+
+    def keys(self):
+        return ['id']
+
+    def fetchmany(self, size=None):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def close(self):
+        self._rows = []
+
+def test_peeked_rows_come_back_first():
+    cursor = FakeCursor([(i,) for i in range(5)])
+    peeked = PeekedResult(cursor, cursor.fetchmany(3))
+    assert peeked.fetchmany(2) == [(0,), (1,)]
+    assert peeked.fetchmany(2) == [(2,), (3,)]
+    assert peeked.fetchmany(2) == [(4,)]
+    assert peeked.fetchmany(2) == []
@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'util'))
+# Needs the build's generated _version module
+configManager = pytest.importorskip('configManager')
+ValidationRules, RegexType = configManager.ValidationRules, configManager.RegexType
+
+def makeRules():
+    rules = ValidationRules()
+    rules.add(r'^[0-9]{4}[/-][0-9]{1,2}[/-][0-9]{1,2}$', RegexType.DEFAULT_DATE, '2020-01-01', '2030-01-01')
+    rules.add(r'^[-]?[0-9]+$', RegexType.DEFAULT_INT, '1', '100')
+    rules.add(r'^[a-z]+$', RegexType.DEFAULT_ALPHA, '2', '4')
+    return rules
+
+def test_classify_checks_bounds():
+    rules = makeRules()
+    assert rules.classify('2023-02-03') == [0]
+    assert rules.classify('2031-01-01') == []
+    assert rules.classify('50') == [1]
+    assert rules.classify('500') == []
+    assert rules.classify('abc') == [2]
+    assert rules.classify('abcde') == []
+
+def test_classify_rejects_impossible_dates():
+    rules = makeRules()
+    assert rules.classify('2023-02-30') == []
+    assert rules.classify('2023-13-01') == []
+
+def test_malformed_rule_is_left_out():
+    rules = ValidationRules()
+    rules.add(r'^[0-9', RegexType.DEFAULT_INT)
+    rules.add(r'^[0-9]+$', RegexType.DEFAULT_INT, 'low')
+    assert len(rules) == 0
@@ -7,6 +7,8 @@ from prompt_toolkit.document import Document
 
 sys.path.append("../src/")
 from configManager import masterDataConfig; cfg = masterDataConfig
+from nameIndex import isSubsequence
+from miniCompleter import MiniCompleter
 
 __all__ = [
     'CommandCompleter',
@@ -20,8 +22,10 @@ class CommandCompleter(Completer):
     - Line-leading words prefixed with the 'leader' are assumed to be MINIQUERY
     system commands and are completed against a list of all MINIQUERY commands.
     - Line-leading words NOT prefixed with the 'leader' are assumed to be
-    MINIQUERY queries, and completion is not attempted.
-    - Words following commands are assumed to be first arguments and are
+    MINIQUERY queries. These, and the arguments of the TQL commands, are
+    completed against the columns of the active table by a MiniCompleter,
+    which queries the table's prebuilt column index.
+    - Words following other commands are assumed to be first arguments and are
     expanded against a list of words proper to that command.
 
     (Distantly) adapted from the prompt-toolkit's WordCompleter. Not all of the
@@ -38,9 +42,11 @@ class CommandCompleter(Completer):
         contain spaces. (Can not be used together with the WORD option.)
     :param match_middle: When True, match not only the start, but also in the
                          middle of the word.
+    :param frecency: Optional FrecencyStore. The candidates used most, and
+        most recently, in the same context are then offered first.
     """
     def __init__(self, words, ignore_case=False, meta_dict=None, WORD=False,
-                 sentence=False, match_middle=False):
+                 sentence=False, match_middle=False, frecency=None):
         assert not (WORD and sentence)
         assert callable(words) or all(isinstance(w, string_types) for w in words)
 
@@ -50,21 +56,19 @@ class CommandCompleter(Completer):
         self.WORD = WORD
         self.sentence = sentence
         self.match_middle = match_middle
-
-    def get_completions(self, document, complete_event):
-        # Get list of candidate words.
+        self.frecency = frecency
+
+    def _candidates(self, text):
+        '''
+        Work out the word being completed in text, a command line stripped of
+        its leader. Returns (scope, candidate words, word before cursor, whether
+        to sort the candidates), where scope names the context for frecency.
+        '''
+        from appSettings import miniSettings; ms = miniSettings
         words = self.words
         if callable(words):
             words = words()
 
-        # Strip off the MINIQUERY command leader, leaving the command name
-        from appSettings import miniSettings; ms = miniSettings
-        if document.text_before_cursor.startswith(ms.settings['leader']):
-            text = document.text_before_cursor.lstrip(ms.settings['leader'])
-        else:
-            # Implicit commands are not handled by this Completer
-            return
-
         # Get word before cursor. Determine whether it's a command name
         # or an argument to a command
         from miniGlobals import commandList, settingOptionsMap
@@ -109,16 +113,81 @@ class CommandCompleter(Completer):
                 elif cmd == 'db':
                     words = [db for db in cfg.databases.keys()]
                 elif cmd == 'table':
+                    # Let the table-name index prune the candidates
                     db = ms.settings['database']
-                    words = [t for t in cfg.databases[db].tableNames]
+                    words = cfg.databases[db].tableIndex.candidates(word_before_cursor)
                 else:
                     words = settingOptionsMap[cmd][0]
             except KeyError:
                 words = []
+            scope = '{} {}.{}'.format(cmd, ms.settings['database'], ms.settings['table'])
         else:
             # The word is a command. Candidates are the commands and aliases.
             word_before_cursor = text
             words = [c[0] for c in commandList] + list(ms.aliases)
+            scope = ''
+        return scope, words, word_before_cursor, doOverallSort
+
+    def _columnCompleter(self):
+        '''
+        A MiniCompleter over the columns of the active table, pruning with the
+        table's column index and ranking by frecency; None if the table's
+        metadata is not loaded
+        '''
+        from appSettings import miniSettings; ms = miniSettings
+        db, table = ms.settings['database'], ms.settings['table']
+        try:
+            tableConfig = cfg.databases[db].tables[table]
+        except KeyError:
+            return None
+        return MiniCompleter([c[0] for c in tableConfig.columnNames], index=tableConfig.columnIndex,
+                    frecency=self.frecency, scope='columns {}.{}'.format(db, table))
+
+    def _isQueryText(self, text):
+        ''' Whether a command line is a TQL query: an implicit one, or a TQL command with arguments '''
+        from appSettings import miniSettings; ms = miniSettings
+        from miniGlobals import tqlCommands
+        if not text.startswith(ms.settings['leader']):
+            return True
+        cmd, space, rest = text.lstrip(ms.settings['leader']).partition(' ')
+        return bool(space) and cmd in tqlCommands
+
+    def recordAccepted(self, line):
+        '''
+        Credit the frecency store with the command name and first argument
+        of an accepted command line, where they were completion candidates
+        '''
+        from appSettings import miniSettings; ms = miniSettings
+        leader = ms.settings['leader']
+        if self.frecency is None:
+            return
+        if self._isQueryText(line):
+            # Credit the accepted column names of a query
+            completer = self._columnCompleter()
+            if completer is not None:
+                columns = set(completer.words)
+                for word in re.findall(r'\w+', line):
+                    if word in columns:
+                        self.frecency.record(completer.scope, word)
+            return
+        words = line[len(leader):].split()
+        for i in range(min(len(words), 2)):
+            scope, candidates, word, doOverallSort = self._candidates(' '.join(words[:i+1]))
+            if word in candidates:
+                self.frecency.record(scope, word)
+
+    def get_completions(self, document, complete_event):
+        from appSettings import miniSettings; ms = miniSettings
+        if self._isQueryText(document.text_before_cursor):
+            # Query particles name the columns of the active table
+            completer = self._columnCompleter()
+            if completer is not None:
+                yield from completer.get_completions(document, complete_event)
+            return
+        # Strip off the MINIQUERY command leader, leaving the command name
+        text = document.text_before_cursor.lstrip(ms.settings['leader'])
+
+        scope, words, word_before_cursor, doOverallSort = self._candidates(text)
         if self.ignore_case:
             word_before_cursor = word_before_cursor.lower()
 
@@ -135,10 +204,11 @@ class CommandCompleter(Completer):
             else:
                 # The core of this completer. See also miniCompleter's
                 # getSubsequenceRegex()
-                regex = '^{}'.format('.*?'.join(word_before_cursor))
-                return re.search(regex, word) is not None
-
-        for a in words:
-            if word_matches(a):
-                display_meta = self.meta_dict.get(a, '')
-                yield Completion(a, -len(word_before_cursor), display_meta=display_meta)
+                return isSubsequence(word_before_cursor, word, anchored=True)
+
+        matches = [a for a in words if word_matches(a)]
+        if self.frecency is not None:
+            matches = self.frecency.rank(scope, matches)
+        for a in matches:
+            display_meta = self.meta_dict.get(a, '')
+            yield Completion(a, -len(word_before_cursor), display_meta=display_meta)
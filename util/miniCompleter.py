@@ -1,9 +1,11 @@
 import sys
 import re
+from collections import OrderedDict
 from six import string_types
 from prompt_toolkit.completion import Completer, Completion
 
 sys.path.append("../src/")
+from appSettings import miniSettings; ms = miniSettings
 
 __all__ = [
     'MiniCompleter',
@@ -16,6 +18,26 @@ class _abbrRecord:
         self.start = start
         self.end = end
 
+class _abbrTable:
+    '''
+    The user's abbreviations, compiled once per version of the abbreviation
+    table. Besides the individual patterns (needed to locate every match,
+    overlapping ones included) we compile all of them into one alternation
+    so that the common case -- no abbreviation in the word at all -- costs a
+    single search.
+    '''
+    def __init__(self, abbrs):
+        self.patterns = []
+        for (abbr, substitution) in abbrs.items():
+            try:
+                self.patterns.append((re.compile(abbr), substitution))
+            except re.error:
+                # A malformed abbreviation simply never matches
+                continue
+        self.anyAbbreviation = re.compile('|'.join(
+                    '(?:{})'.format(p.pattern) for (p, s) in self.patterns)) \
+                if self.patterns else None
+
 class MiniCompleter(Completer):
     """
     Adapted from WordCompleter, which is simple completion by extension
@@ -31,9 +53,14 @@ class MiniCompleter(Completer):
         contain spaces. (Can not be used together with the WORD option.)
     :param match_middle: When True, match not only the start, but also in the
                          middle of the word.
+    :param index: Optional SubsequenceIndex over the words, used to prune the
+        candidates before the regexes are run.
+    :param frecency: Optional FrecencyStore used to offer the words accepted
+        most, and most recently, in the given scope first.
+    :param scope: The frecency scope, e.g. the database and table the words belong to.
     """
     def __init__(self, words, ignore_case=False, meta_dict=None, WORD=False,
-                 sentence=False, match_middle=False):
+                 sentence=False, match_middle=False, index=None, frecency=None, scope=''):
         assert not (WORD and sentence)
         assert callable(words) or all(isinstance(w, string_types) for w in words)
 
@@ -43,23 +70,61 @@ class MiniCompleter(Completer):
         self.WORD = WORD
         self.sentence = sentence
         self.match_middle = match_middle
+        self.index = index
+        self.frecency = frecency
+        self.scope = scope
         self.regexCollection = []
 
+    # The compiled matchers for recently completed words, most recent last,
+    # and the compiled abbreviation table they were built from
+    MATCHER_CACHE_SIZE = 256
+    _matcherCache = OrderedDict()
+    _abbrTable = None
+    _abbrTableVersion = None
+
+    @classmethod
+    def _getAbbreviationTable(cls, abbrs):
+        if cls._abbrTable is None or cls._abbrTableVersion != abbrs._version:
+            cls._abbrTable = _abbrTable(abbrs)
+            cls._abbrTableVersion = abbrs._version
+            # Matchers built from the old table are stale
+            cls._matcherCache.clear()
+        return cls._abbrTable
+
     def build_regexes(self, given_word):
+        '''
+        Look up the compiled matchers for given_word, building them on a cache miss.
+        The cache is keyed by the word and the version of the abbreviation table.
+        '''
+        abbrTable = self._getAbbreviationTable(ms.completion['Abbreviations'])
+        assumeInitial = ms.completion.as_bool('assumeInitial')
+        key = (given_word, assumeInitial)
+        matchers = self._matcherCache.get(key)
+        if matchers is None:
+            matchers = [re.compile(r) for r in
+                            self._build_regexes(given_word, abbrTable, assumeInitial)]
+            self._matcherCache[key] = matchers
+            if len(self._matcherCache) > self.MATCHER_CACHE_SIZE:
+                self._matcherCache.popitem(last=False)
+        else:
+            self._matcherCache.move_to_end(key)
+        self.regexCollection = matchers
+
+    def _build_regexes(self, given_word, abbrTable, assumeInitial):
         # Build the regex(es) that we will use to identify all possible
         # substitutions while allowing for non-substitution of the same by
         # applying the straightforward subsequence-matching algorithm as well as any
         # additional regexes to accommodate abbreviations in given_word.
+        regexes = []
 
         # Build a list of abbreviations found in the text, and
         # sort the found abbreviations by their starting position
         abbrList=[]
-        from includes import miniSettings; ms = miniSettings
-        abbrs = ms.settings['Completion']['Abbreviations']
-        for abb in abbrs.items():
-            m = re.search(abb[0], given_word)
-            if m:
-                abbrList.append(_abbrRecord(m.group(0), abb[1], m.start(), m.end()))
+        if abbrTable.anyAbbreviation and abbrTable.anyAbbreviation.search(given_word):
+            for (pattern, substitution) in abbrTable.patterns:
+                m = pattern.search(given_word)
+                if m:
+                    abbrList.append(_abbrRecord(m.group(0), substitution, m.start(), m.end()))
         def sortKey(abbrList):
             return abbrList.start
         abbrList = sorted(abbrList, key=sortKey)
@@ -73,7 +138,10 @@ class MiniCompleter(Completer):
         abbrIndex = -1; lookAheadIndex = 0
         lowerBoundforAppend = 0; workingList = []
         maximalLists = []; allFeasibleLists = []      # lists of lists
-        while True:
+        if not abbrCount:
+            # Nothing to group: plain subsequence matching only
+            maximalLists.append([])
+        while abbrCount:
             # Look ahead for the next interval that can be added to the group
             lookAheadIndex = abbrIndex + 1
             while lookAheadIndex < abbrCount \
@@ -147,7 +215,6 @@ class MiniCompleter(Completer):
         # Build the regex corresponding to each maximal list and check it
         # against the given word
         workingList.clear()
-        assumeInitial = ms.settings['Completion'].as_bool('assumeInitial')
         for maximalList in maximalLists:
 
             # Create a scratch copy of the given_word with parentheses inserted
@@ -180,7 +247,9 @@ class MiniCompleter(Completer):
                 fullRegex = ''.join(pairRegexes)
 
             # Save the current regex
-            self.regexCollection.append(fullRegex)
+            regexes.append(fullRegex)
+
+        return regexes
 
     def word_matches(self, word, given_word):
         """ True when the word before the cursor matches. """
@@ -190,7 +259,7 @@ class MiniCompleter(Completer):
         # Check whether the (candidate) word completes the given_word
         # by looking at all the matching regexes
         for regex in self.regexCollection:
-            if re.search(regex, word):
+            if regex.search(word):
                 return True
         return False
 
@@ -211,10 +280,19 @@ class MiniCompleter(Completer):
 
         self.build_regexes(word_before_cursor)
 
-        for a in words:
-            if self.word_matches(a, word_before_cursor):
-                display_meta = self.meta_dict.get(a, '')
-                yield Completion(a, -len(word_before_cursor), display_meta=display_meta)
+        # The index prefilter is only sound when no abbreviation applies,
+        # since an abbreviation's substitution need not share its characters
+        if self.index is not None:
+            anyAbbreviation = self._abbrTable.anyAbbreviation
+            if not (anyAbbreviation and anyAbbreviation.search(word_before_cursor)):
+                words = self.index.candidates(word_before_cursor)
+
+        matches = [a for a in words if self.word_matches(a, word_before_cursor)]
+        if self.frecency is not None:
+            matches = self.frecency.rank(self.scope, matches)
+        for a in matches:
+            display_meta = self.meta_dict.get(a, '')
+            yield Completion(a, -len(word_before_cursor), display_meta=display_meta)
 
-        self.regexCollection.clear()
+        self.regexCollection = []
 
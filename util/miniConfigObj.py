@@ -1013,6 +1013,10 @@ class Section(dict):
 
 class MiniSection(Section):
 
+    # Bumped on every change to the section's own entries, so that structures
+    # derived from a section (compiled matchers etc.) know when to rebuild
+    _version = 0
+
     def __setitem__(self, key, value, unrepr=False):
         '''
         Tap into the base class Section (defined above) to track changes to the Config Settings
@@ -1032,12 +1036,14 @@ class MiniSection(Section):
                     indict=value,
                     name=key))
         # Track the changes we need to track
+        self._version += 1
         self.main._changed = True
         if key in ['database', 'table']:  # Omit MINI_USER and MINI_HOST
             self.main._promptChanged = True
 
     def __delitem__(self, key, unrepr=False):
         Section.__delitem__(self, key, unrepr)
+        self._version += 1
         self.main._changed = True
         if key in ['database', 'table']:  # Omit MINI_USER and MINI_HOST
             self.main._promptChanged = True
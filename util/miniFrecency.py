@@ -0,0 +1,110 @@
+import os
+import math
+import time
+import heapq
+
+__all__ = [
+    'FrecencyStore',
+]
+
+class FrecencyStore:
+    '''
+    Remembers how often and how recently each completion was accepted, per
+    scope (e.g. the command and the active database and table), so that the
+    likeliest candidates can be offered first.
+
+    Every use of a word adds 1 to its score, and the score halves every
+    HALF_LIFE seconds. The stored value is log2 of the score as it would have
+    been at time zero. That value does not change as time passes, so scores
+    recorded at different times compare directly, and nothing needs to be
+    recomputed until the word is used again.
+
+    The store is kept in a tab-separated file, one "score, scope, word" line
+    per entry, loaded on first use and rewritten by save(). Once it grows past
+    maxEntries, the lowest-scored entries are dropped.
+    '''
+
+    HALF_LIFE = 14 * 24 * 3600
+    MAX_ENTRIES = 5000
+    # Ranking puts at most this many previously used words ahead of the rest
+    TOP_COUNT = 10
+
+    def __init__(self, fileName, maxEntries=MAX_ENTRIES):
+        self.fileName = fileName
+        self._maxEntries = maxEntries
+        self._scores = None     # (scope, word) -> log score, loaded by _getScores()
+        self._changed = False
+
+    def __len__(self):
+        return len(self._getScores())
+
+    def _getScores(self):
+        if self._scores is None:
+            self._scores = {}
+            try:
+                with open(self.fileName, 'r') as frecencyFp:
+                    for line in frecencyFp:
+                        fields = line.rstrip('\n').split('\t')
+                        if len(fields) == 3:
+                            try:
+                                self._scores[(fields[1], fields[2])] = float(fields[0])
+                            except ValueError:
+                                continue
+            except OSError:
+                # A missing or unreadable store just starts out empty
+                pass
+        return self._scores
+
+    def record(self, scope, word, now=None):
+        ''' Credit one use of word in scope '''
+        if '\t' in scope + word or '\n' in scope + word:
+            return
+        scores = self._getScores()
+        use = (time.time() if now is None else now) / self.HALF_LIFE
+        old = scores.get((scope, word))
+        # log2(2**old + 2**use), computed without overflow
+        scores[(scope, word)] = use if old is None else \
+                max(old, use) + math.log2(1 + 2 ** -abs(old - use))
+        self._changed = True
+        # Evict in batches rather than on every new word
+        if len(scores) > self._maxEntries + self._maxEntries // 10:
+            self._evict()
+
+    def _evict(self):
+        scores = self._getScores()
+        for key in heapq.nsmallest(len(scores) - self._maxEntries, scores, key=scores.get):
+            del scores[key]
+
+    def score(self, scope, word):
+        return self._getScores().get((scope, word))
+
+    def rank(self, scope, words, topCount=TOP_COUNT):
+        '''
+        Reorder a list of candidates: up to topCount words used before come
+        first, highest score first, followed by the rest in their given order.
+        The top words are picked with a heap, in O(n log topCount).
+        '''
+        scores = self._getScores()
+        used = [word for word in words if (scope, word) in scores]
+        if not used:
+            return words
+        top = heapq.nlargest(topCount, used, key=lambda word: scores[(scope, word)])
+        topWords = set(top)
+        return top + [word for word in words if word not in topWords]
+
+    def save(self):
+        if not self._changed:
+            return
+        scores = self._getScores()
+        if len(scores) > self._maxEntries:
+            self._evict()
+        tempName = self.fileName + '.tmp'
+        try:
+            with open(tempName, 'w') as frecencyFp:
+                for ((scope, word), score) in scores.items():
+                    frecencyFp.write('{:.6f}\t{}\t{}\n'.format(score, scope, word))
+            os.replace(tempName, self.fileName)
+            self._changed = False
+        except OSError:
+            # As with the history file, an unwritable store is not worth a complaint
+            pass
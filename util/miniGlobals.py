@@ -39,6 +39,8 @@ commandList = [
     ['table',   '<name>',         'Set the active table name',          'SetTable'],
     ['clear',   '',               'Clear the active table name',        'ClearTable'],
     ['format',  '',               'Select a format for query output'],
+    ['cache',   '<clear>',        'Show result cache statistics, or clear the cache'],
+    ['refresh', '<full>',         'Re-sync the schema cache of the active database'],
     ['set',     '<name>=<value>', 'Set a MINIQUERY program setting'],
     ['seta',    '<alias>=<cmd>',  'Set up an alias for a command',      'Alias'],
     ['setabb',  '<abbr>=<full>',  'Set up an abbreviation for db object naming', 'Abbreviate'],
@@ -48,7 +50,7 @@ commandList = [
     ['getabb',  '<abbreviation>', 'Inspect an abbreviation',            'GetAbbreviation'],
     ['getv',    '<variable>',     'Inspect a variable',                 'GetVariable'],
     ['save',    '<file>',         'Save MINIQUERY settings, aliases and variables'],
-    ['source',  '<file>',         'Read and execute commands from a file'],
+    ['source',  '<-j=n> <file>',  'Read and execute commands from a file, n queries at a time'],
     ['unset',   '<name>',         'Unset a MINIQUERY setting'],
     ['unseta',  '<name>',         'Unset an alias',                     'Unalias'],
     ['unsetabb','<abbreviation>', 'Unset an abbreviation',              'Unabbreviate'],
@@ -59,7 +61,7 @@ commandList = [
 # Constants for interactive selection of finite-option settings:
 # 3-tuples containing option list, dialog title, and dialog text
 settingOptionsMap = {
-    'format'   : (['tab','wrap','nowrap','vertical'],
+    'format'   : (['tab','wrap','nowrap','vertical','csv','ndjson','arrow'],
                     'Result set formatting',
                     'Please choose a display format for query results:'),
     'endlineProtocol' : (['delimit','continue'],
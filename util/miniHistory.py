@@ -0,0 +1,19 @@
+from prompt_toolkit.history import FileHistory
+
+from errorManager import miniErrorManager; em = miniErrorManager
+
+class MiniFileHistory(FileHistory):
+    '''
+    A specialized FileHistory that handles file access issues gracefully
+    '''
+    def __init__(self, filename):
+        self._doStore = True
+        super(MiniFileHistory, self).__init__(filename)
+
+    def store_string(self, string: str):
+        if self._doStore:
+            try:
+                FileHistory.store_string(self, string)
+            except PermissionError as ex:
+                self._doStore = False
+                em.setException(ex, "Miniquery command history file", "Commands will not be saved.")